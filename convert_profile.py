@@ -0,0 +1,21 @@
+import sys
+import os
+from src.storage.binary_store import convert_json_profile
+
+# Setup Paths
+base_dir = os.path.dirname(os.path.abspath(__file__))
+data_dir = os.path.join(base_dir, "data")
+json_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(data_dir, "profile.json")
+binary_path = sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(json_path)[0] + ".bin"
+
+print(f"Converting profile: {json_path} -> {binary_path}")
+
+try:
+    profile = convert_json_profile(json_path, binary_path)
+    print(f"Profile Name: {profile.name}")
+    print(f"Daily Log Count: {len(profile.daily_log)}")
+    print(f"Size: {os.path.getsize(json_path)} -> {os.path.getsize(binary_path)} bytes")
+    print("Done. Point MemoryManager at the .bin path to use it.")
+
+except Exception as e:
+    print(f"Error: {e}")
@@ -37,7 +37,7 @@ try:
     results = mm.vector_store.collection.get(where={"type": "daily_log"})
     if results['ids']:
         for i, id in enumerate(results['ids']):
-            print(f"ID: {id} | Content: {results['metadatas'][i].get('original_content')[:50]}...")
+            print(f"ID: {id} | Content: {results['documents'][i][:50]}...")
     else:
         print("No daily_log items found.")
 
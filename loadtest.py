@@ -0,0 +1,390 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from chromadb.api.types import EmbeddingFunction
+
+from src.core.memory_manager import MemoryManager
+from src.core.reflection import ReflectionEngine, ReflectionSession
+from src.core.context_builder import ConversationContext
+from src.models.schema import MemoryItem
+from src.services.llm_service import LLMService, LLMError
+
+# End-to-end load test: a local OpenAI-compatible stub stands in for the LLM provider,
+# and simulated players chat with many characters through MemoryManager.
+#
+#   python loadtest.py --characters 20 --players 16 --duration 60 --ttft 0.4 --tokens-per-sec 80
+
+WORDS = "the old road north was quiet tonight and the lanterns flickered over wet stones while travelers spoke of rumors".split()
+
+# --- Stub LLM server ---
+
+class StubConfig:
+    ttft = 0.3
+    tokens_per_sec = 60.0
+    response_tokens = 40
+    error_rate = 0.0
+    # Streams that break off halfway with an error event
+    stream_error_rate = 0.0
+
+class StubStats:
+    lock = threading.Lock()
+    requests = 0
+    errors = 0
+    streamed = 0
+
+def _reply_for(messages) -> str:
+    system = messages[0]["content"] if messages and messages[0]["role"] == "system" else ""
+    last = messages[-1]["content"] if messages else ""
+    if "Output only JSON" in system:
+        # Reflection request
+        return json.dumps({
+            "daily_log": {"activity": "Talked with a traveler about the road.", "interacted_with": ["Traveler"]},
+            "mood": random.choice(["Calm", "Curious", "Wary", "Cheerful"]),
+            "relationships": {"Traveler": {"affinity": random.randint(-10, 30), "tags": ["Acquaintance"], "history": ["Shared news."]}}
+        })
+    if last.startswith("Summarize"):
+        return "They talked about the road, the weather and old rumors."
+    return " ".join(random.choice(WORDS) for _ in range(StubConfig.response_tokens))
+
+class StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with StubStats.lock:
+            StubStats.requests += 1
+
+        if random.random() < StubConfig.error_rate:
+            with StubStats.lock:
+                StubStats.errors += 1
+            self._send_json(500, {"error": {"message": "Injected error", "type": "server_error"}})
+            return
+
+        model = body.get("model", "stub")
+        reply = _reply_for(body.get("messages", []))
+        tokens = reply.split(" ")
+        delay = 1.0 / StubConfig.tokens_per_sec if StubConfig.tokens_per_sec > 0 else 0
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+        time.sleep(StubConfig.ttft)
+        if not body.get("stream"):
+            time.sleep(delay * len(tokens))
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)}
+            })
+            return
+
+        with StubStats.lock:
+            StubStats.streamed += 1
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        break_at = len(tokens) // 2 if random.random() < StubConfig.stream_error_rate else None
+        try:
+            for i, token in enumerate(tokens):
+                if i == break_at:
+                    with StubStats.lock:
+                        StubStats.errors += 1
+                    self.wfile.write(b'data: {"error": {"message": "Injected stream error", "type": "server_error"}}\n\n')
+                    self.wfile.flush()
+                    return
+                self._send_event(completion_id, model, {"content": token if i == 0 else " " + token}, None)
+                time.sleep(delay)
+            self._send_event(completion_id, model, {}, "stop")
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Client gave up (e.g. a first-token timeout)
+
+    def _send_event(self, completion_id, model, delta, finish_reason):
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+        }
+        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+def start_stub_server(port: int = 0) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-llm", daemon=True).start()
+    return server
+
+# --- Offline embeddings ---
+
+class HashEmbeddingFunction(EmbeddingFunction):
+    """Deterministic bag-of-words hashing, so the load test needs no model download."""
+    def __init__(self, dimensions: int = 384):
+        self.dimensions = dimensions
+
+    def __call__(self, input):
+        vectors = []
+        for text in input:
+            v = np.zeros(self.dimensions, dtype=np.float32)
+            for word in text.lower().split():
+                v[int(hashlib.md5(word.encode("utf-8")).hexdigest()[:8], 16) % self.dimensions] += 1.0
+            norm = np.linalg.norm(v)
+            vectors.append(v / norm if norm else v)
+        return vectors
+
+    @staticmethod
+    def name() -> str:
+        return "loadtest-hash"
+
+    def get_config(self):
+        return {"dimensions": self.dimensions}
+
+    @staticmethod
+    def build_from_config(config):
+        return HashEmbeddingFunction(config.get("dimensions", 384))
+
+# --- Measurements ---
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.turns = 0
+        self.llm_errors = 0
+        self.timeline = []
+
+    def record(self, name: str, seconds: float):
+        with self.lock:
+            self.latencies.setdefault(name, []).append(seconds * 1000)
+
+def percentile(values, p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(p * len(values)), len(values) - 1)]
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        # Peak rather than current RSS on platforms without /proc (KB on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        return 0.0
+
+# --- Simulation ---
+
+class Character:
+    def __init__(self, index: int, root: str, llm_service: LLMService, reflect_every: int, embedding_function=None):
+        directory = os.path.join(root, f"npc_{index}")
+        os.makedirs(directory, exist_ok=True)
+        self.mm = MemoryManager(os.path.join(directory, "profile.json"), os.path.join(directory, "chroma_db"), llm_service,
+                                embedding_function=embedding_function)
+        self.mm.profile.name = f"NPC {index}"
+        self.mm.profile.context.occupation = random.choice(["Innkeeper", "Guard", "Merchant", "Scholar"])
+        self.mm.save_profile()
+        self.engine = ReflectionEngine(self.mm, retry_delay=0.5)
+        self.reflect_every = reflect_every
+
+def player_loop(player: int, characters, llm_service: LLMService, stats: Stats, args, stop_at: float):
+    rng = random.Random(player)
+    user_name = f"Player{player}"
+    while time.time() < stop_at:
+        character = rng.choice(characters)
+        mm = character.mm
+        conversation = ConversationContext(llm_service)
+        session = ReflectionSession(character.engine, every_n_turns=character.reflect_every)
+
+        for _ in range(args.turns_per_conversation):
+            if time.time() >= stop_at:
+                break
+            user_input = " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 20)))
+            start = time.perf_counter()
+
+            # 1. Retrieve
+            memories = mm.retrieve_relevant_memories(user_input, n_results=10)
+            retrieved = time.perf_counter()
+            stats.record("retrieve", retrieved - start)
+
+            # 2. Generate (streamed, like the app)
+            context_str = "\n".join([f"- {m['content']}" for m in memories])
+            system_prompt = mm._construct_system_prompt(user_name=user_name)
+            messages = conversation.build_messages(system_prompt, user_input, context_str)
+            first_token = None
+            parts = []
+            failed = False
+            for token in llm_service.generate_chat_stream(messages) if not args.no_stream else [llm_service.generate_chat(messages)]:
+                # Errors can also arrive after some tokens, when a stream breaks off
+                if isinstance(token, LLMError):
+                    failed = True
+                    continue
+                if first_token is None:
+                    first_token = time.perf_counter()
+                parts.append(token)
+            generated = time.perf_counter()
+            response = "".join(parts)
+            stats.record("ttft", (first_token or generated) - retrieved)
+            stats.record("llm_total", generated - retrieved)
+            if failed:
+                with stats.lock:
+                    stats.llm_errors += 1
+                continue
+
+            # 3. Store
+            mm.save_interaction(user_input, response, user_name=user_name)
+            saved = time.perf_counter()
+            stats.record("save_interaction", saved - generated)
+
+            conversation.add_turn(user_input, response)
+            session.add_turn(user_input, response, user_name=user_name)
+            stats.record("turn_total", saved - start)
+            with stats.lock:
+                stats.turns += 1
+
+        session.end(user_name=user_name)
+
+def sampler_loop(characters, stats: Stats, interval: float, stop: threading.Event, started: float):
+    while not stop.wait(interval):
+        memories = sum(c.mm.vector_store.collection.count() for c in characters)
+        pending = sum(c.engine.pending_count() for c in characters)
+        with stats.lock:
+            stats.timeline.append((time.time() - started, rss_mb(), stats.turns, memories, pending))
+
+def report(stats: Stats, characters, args, elapsed: float):
+    print("\n=== Load Test Report ===")
+    print(f"Characters: {args.characters} | Players: {args.players} | Duration: {elapsed:.1f}s")
+    print(f"Stub: TTFT {args.ttft}s | {args.tokens_per_sec} tok/s | {args.response_tokens} tokens | error rate {args.error_rate} | stream error rate {args.stream_error_rate}")
+    print(f"Turns: {stats.turns} | Throughput: {stats.turns / elapsed:.2f} turns/s | LLM errors: {stats.llm_errors}")
+    print(f"Stub requests: {StubStats.requests} (streamed {StubStats.streamed}, injected errors {StubStats.errors})")
+
+    print("\nLatency (ms)          count      p50      p95      p99      max")
+    for name in ["retrieve", "ttft", "llm_total", "save_interaction", "turn_total"]:
+        values = stats.latencies.get(name, [])
+        print(f"{name:<20}{len(values):>8}{percentile(values, 0.5):>9.1f}{percentile(values, 0.95):>9.1f}"
+              f"{percentile(values, 0.99):>9.1f}{max(values) if values else 0:>9.1f}")
+
+    print("\nOver time      RSS (MB)    turns   memories   reflections pending")
+    for t, rss, turns, memories, pending in stats.timeline:
+        print(f"{t:>8.1f}s{rss:>13.1f}{turns:>9}{memories:>11}{pending:>12}")
+
+    jobs = [j for c in characters for j in c.engine.recent_jobs(limit=c.engine.max_history)]
+    statuses = {}
+    for job in jobs:
+        statuses[job.status] = statuses.get(job.status, 0) + 1
+    print(f"\nReflection jobs (recent): {statuses}")
+
+    print("\nLLM routes        calls  failures  SLO misses")
+    for task, profiles in characters[0].mm.llm_service.router.stats().items():
+        for p in profiles:
+            print(f"{task:<14}{p['calls']:>8}{p['failures']:>10}{p['slo_misses']:>12}  {p['model']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end load test against a local stub LLM.")
+    parser.add_argument("--characters", type=int, default=10)
+    parser.add_argument("--players", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to drive load")
+    parser.add_argument("--turns-per-conversation", type=int, default=8)
+    parser.add_argument("--reflect-every", type=int, default=4, help="Turns between incremental reflections")
+    parser.add_argument("--seed-memories", type=int, default=200, help="Memories per character before the run")
+    parser.add_argument("--ttft", type=float, default=0.3, help="Stub time to first token (s)")
+    parser.add_argument("--tokens-per-sec", type=float, default=60.0)
+    parser.add_argument("--response-tokens", type=int, default=40)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of stub requests failing with HTTP 500")
+    parser.add_argument("--stream-error-rate", type=float, default=0.0, help="Fraction of streams failing halfway through")
+    parser.add_argument("--no-stream", action="store_true", help="Use non-streamed chat completions")
+    parser.add_argument("--real-embeddings", action="store_true", help="Use Chroma's default embedding model instead of hashing")
+    parser.add_argument("--sample-interval", type=float, default=5.0)
+    parser.add_argument("--data-dir", default=None, help="Defaults to a temporary directory, removed afterwards")
+    args = parser.parse_args()
+
+    StubConfig.ttft = args.ttft
+    StubConfig.tokens_per_sec = args.tokens_per_sec
+    StubConfig.response_tokens = args.response_tokens
+    StubConfig.error_rate = args.error_rate
+    StubConfig.stream_error_rate = args.stream_error_rate
+
+    embedding_function = None if args.real_embeddings else HashEmbeddingFunction()
+
+    server = start_stub_server()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    llm_service = LLMService(api_key="loadtest", model="stub-model", base_url=base_url)
+    print(f"Stub LLM listening on {base_url}")
+
+    root = args.data_dir or tempfile.mkdtemp(prefix="loadtest_")
+    print(f"Creating {args.characters} characters in {root} ...")
+    characters = [Character(i, root, llm_service, args.reflect_every, embedding_function) for i in range(args.characters)]
+    for c in characters:
+        if args.seed_memories:
+            c.mm.vector_store.add_memories([
+                MemoryItem(id=str(uuid.uuid4()), type="observation", content=" ".join(random.choice(WORDS) for _ in range(12)))
+                for _ in range(args.seed_memories)
+            ])
+
+    stats = Stats()
+    started = time.time()
+    stop = threading.Event()
+    sampler = threading.Thread(target=sampler_loop, args=(characters, stats, args.sample_interval, stop, started), daemon=True)
+    sampler.start()
+
+    stop_at = started + args.duration
+    players = [
+        threading.Thread(target=player_loop, args=(p, characters, llm_service, stats, args, stop_at), daemon=True)
+        for p in range(args.players)
+    ]
+    for t in players:
+        t.start()
+    for t in players:
+        t.join()
+    elapsed = time.time() - started
+
+    print("Waiting for background reflections ...")
+    for c in characters:
+        c.engine.wait(timeout=30)
+    stop.set()
+    with stats.lock:
+        stats.timeline.append((time.time() - started, rss_mb(), stats.turns,
+                               sum(c.mm.vector_store.collection.count() for c in characters),
+                               sum(c.engine.pending_count() for c in characters)))
+
+    report(stats, characters, args, elapsed)
+    server.shutdown()
+    if not args.data_dir:
+        shutil.rmtree(root, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+import sys
+import os
+from src.core.memory_manager import MemoryManager
+from src.services.llm_service import LLMService
+
+# Setup Paths
+base_dir = os.path.dirname(os.path.abspath(__file__))
+data_dir = os.path.join(base_dir, "data")
+profile_path = os.path.join(data_dir, "profile.json")
+vector_db_path = os.path.join(data_dir, "chroma_db")
+
+print(f"Moving memory content out of Chroma metadata at: {vector_db_path}")
+
+try:
+    llm_service = LLMService()
+    mm = MemoryManager(profile_path, vector_db_path, llm_service)
+
+    migrated = mm.vector_store.migrate_legacy_content()
+    print(f"Migrated {migrated} memories.")
+
+except Exception as e:
+    print(f"Error: {e}")
@@ -0,0 +1,64 @@
+import sys
+import os
+from chromadb.utils import embedding_functions
+from src.storage.vector_store import VectorStore
+from src.storage.reindex import Reindexer
+
+# Re-embeds all memories with another model into a shadow collection, then switches reads to it.
+# Safe to interrupt (Ctrl+C pauses it): running it again with the same model resumes where it stopped.
+#
+# Usage:
+#   python reindex.py <sentence-transformers model | default> [data_dir]
+#   python reindex.py status [data_dir]
+#   python reindex.py drop-old [data_dir]
+#
+# Run it while the app is stopped, or call MemoryManager.start_reindex from the app process
+# to keep serving the character meanwhile. Other processes only see the switch on restart, so
+# the old collection is kept; run drop-old once they all have.
+base_dir = os.path.dirname(os.path.abspath(__file__))
+
+if len(sys.argv) < 2:
+    print("Usage: python reindex.py <model|default|status|drop-old> [data_dir]")
+    sys.exit(1)
+
+model = sys.argv[1]
+data_dir = sys.argv[2] if len(sys.argv) > 2 else os.path.join(base_dir, "data")
+vector_db_path = os.path.join(data_dir, "chroma_db")
+
+try:
+    vs = VectorStore(vector_db_path)
+    if model == "status":
+        print(vs.reindex_state.model_dump_json(indent=2))
+        sys.exit(0)
+    if model == "drop-old":
+        dropped = vs.drop_previous_collection()
+        print(f"Dropped collection {dropped}." if dropped else "No previous collection to drop.")
+        sys.exit(0)
+
+    if model == "default":
+        embedding_function = embedding_functions.DefaultEmbeddingFunction()
+    else:
+        embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(model_name=model)
+
+    total = vs.collection.count()
+    print(f"Re-indexing {total} memories at {vector_db_path} with {model} ...")
+    reindexer = Reindexer(vs, embedding_function)
+    thread = reindexer.run_in_background()
+    try:
+        while thread.is_alive():
+            state = vs.reindex_state
+            print(f"  {state.status}: {state.offset}/{total} read, {state.copied} copied")
+            thread.join(timeout=5)
+    except KeyboardInterrupt:
+        print("Pausing after the current round ...")
+        reindexer.cancel()
+        thread.join()
+
+    state = vs.reindex_state
+    if state.status == "complete":
+        print(f"Done. Reads now use collection {state.active_collection}; {state.previous_collection} is kept until drop-old.")
+    else:
+        print(f"Stopped with status {state.status}: {state.error}")
+
+except Exception as e:
+    print(f"Error: {e}")
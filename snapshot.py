@@ -0,0 +1,44 @@
+import sys
+import os
+from src.core.memory_manager import MemoryManager
+from src.services.llm_service import LLMService
+from src.storage.snapshot_store import SnapshotStore
+
+# Usage:
+#   python snapshot.py create  <character_id> [data_dir]
+#   python snapshot.py list    <character_id>
+#   python snapshot.py restore <character_id> [snapshot_id] [data_dir]
+base_dir = os.path.dirname(os.path.abspath(__file__))
+snapshot_dir = os.path.join(base_dir, "snapshots")
+
+def open_character(data_dir: str) -> MemoryManager:
+    profile_path = os.path.join(data_dir, "profile.bin")
+    if not os.path.exists(profile_path):
+        profile_path = os.path.join(data_dir, "profile.json")
+    return MemoryManager(profile_path, os.path.join(data_dir, "chroma_db"), LLMService())
+
+if len(sys.argv) < 3:
+    print("Usage: python snapshot.py create|list|restore <character_id> ...")
+    sys.exit(1)
+
+command, character_id = sys.argv[1], sys.argv[2]
+store = SnapshotStore(snapshot_dir)
+
+try:
+    if command == "create":
+        data_dir = sys.argv[3] if len(sys.argv) > 3 else os.path.join(base_dir, "data")
+        snapshot = store.create(character_id, open_character(data_dir))
+        print(f"Created snapshot {snapshot.id}: {len(snapshot.memories)} memories, {snapshot.new_records} new or changed.")
+    elif command == "list":
+        for snapshot in store.list_snapshots(character_id):
+            print(f"{snapshot.id} | {snapshot.created_at} | {len(snapshot.memories)} memories | {snapshot.new_records} new")
+    elif command == "restore":
+        snapshot_id = sys.argv[3] if len(sys.argv) > 3 else None
+        data_dir = sys.argv[4] if len(sys.argv) > 4 else os.path.join(base_dir, "data")
+        snapshot = store.restore(character_id, snapshot_id, open_character(data_dir))
+        print(f"Restored snapshot {snapshot.id} into {data_dir}.")
+    else:
+        print(f"Unknown command: {command}")
+
+except Exception as e:
+    print(f"Error: {e}")
@@ -9,15 +9,14 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from dotenv import load_dotenv
 from src.core.memory_manager import MemoryManager
 from src.services.llm_service import LLMService
+from src.core.reflection import ReflectionEngine, ReflectionSession
+from src.core.context_builder import ConversationContext, estimate_tokens
+from src.core.metrics import metrics
 
 # Load environment variables
 # Load environment variables
 load_dotenv()
 
-# Simple token estimator (approx 4 chars per token)
-def estimate_tokens(text: str) -> int:
-    return len(text) // 4 if text else 0
-
 def get_dir_size(path):
     total = 0
     try:
@@ -33,26 +32,12 @@ def get_dir_size(path):
 
 st.set_page_config(page_title="AI Character Memory System", layout="wide")
 
-# --- Session State Initialization ---
-if "chat_history" not in st.session_state:
-    st.session_state.chat_history = []
-
-if "rag_latencies" not in st.session_state:
-    st.session_state.rag_latencies = []
-
-# Hot-fix: Check for stale MemoryManager instance (due to code updates)
-if "memory_manager" in st.session_state:
-    import inspect
-    try:
-        sig = inspect.signature(st.session_state.memory_manager.save_interaction)
-        if "user_name" not in sig.parameters:
-            st.warning("Detecting code update... Refreshing Memory Manager.")
-            del st.session_state["memory_manager"]
-            st.rerun()
-    except Exception:
-        pass
-
-if "memory_manager" not in st.session_state:
+@st.cache_resource
+def get_shared_character():
+    """
+    One MemoryManager (Chroma client, embedder, profile) and reflection worker for the whole
+    process, shared by every browser session. Profile changes go through its lock.
+    """
     # Ensure directories exist
     os.makedirs("data", exist_ok=True)
     
@@ -62,8 +47,23 @@ if "memory_manager" not in st.session_state:
     # Initialize Services
     llm_service = LLMService()
     mm = MemoryManager(profile_path, vector_db_path, llm_service)
-    
-    st.session_state.memory_manager = mm
+    return mm, ReflectionEngine(mm)
+
+# --- Session State Initialization ---
+# Per session: only the conversation itself, everything heavy is shared
+if "chat_history" not in st.session_state:
+    st.session_state.chat_history = []
+    metrics.increment("sessions")
+
+st.session_state.memory_manager, st.session_state.reflection_engine = get_shared_character()
+
+if "reflection_session" not in st.session_state:
+    # Reflect in the background on every few new turns instead of once at the end
+    st.session_state.reflection_session = ReflectionSession(st.session_state.reflection_engine, every_n_turns=6)
+
+if "conversation" not in st.session_state:
+    # Recent turns + rolling summary of older ones, sent along with each prompt
+    st.session_state.conversation = ConversationContext(st.session_state.memory_manager.llm_service)
 
 # --- Sidebar: Settings & Profile ---
 with st.sidebar:
@@ -74,20 +74,29 @@ with st.sidebar:
     # Check for API Key in environment
     env_api_key = os.getenv("OPENROUTER_API_KEY")
     
+    # The LLM service is shared by every session: the key and model stay in this session
+    session_api_key = None
     if env_api_key and env_api_key != "sk-or-v1-your-key-here":
-        st.session_state.memory_manager.llm_service.set_api_key(env_api_key)
+        session_api_key = env_api_key
         st.success("✅ API Key loaded from local .env file")
     else:
         st.warning("API Key not found in .env file.")
         api_key_input = st.text_input("Enter OpenRouter API Key (or configure .env)", type="password")
         if api_key_input:
-            st.session_state.memory_manager.llm_service.set_api_key(api_key_input)
+            session_api_key = api_key_input
             st.success("API Key Set!")
 
     model_name = st.text_input("Model Name", value="x-ai/grok-4.1-fast:free")
-    if model_name != st.session_state.memory_manager.llm_service.model:
-        st.session_state.memory_manager.llm_service.set_model(model_name)
-        st.success(f"Model set to {model_name}")
+    llm_settings = (session_api_key, model_name)
+    if st.session_state.get("llm_settings") != llm_settings:
+        # Session view of the shared service: same pools and slots, this session's key and model
+        session_llm = st.session_state.memory_manager.llm_service.for_session(api_key=session_api_key, model=model_name)
+        st.session_state.llm_service = session_llm
+        st.session_state.conversation.llm_service = session_llm
+        st.session_state.reflection_session.llm_service = session_llm
+        if st.session_state.get("llm_settings") and st.session_state.llm_settings[1] != model_name:
+            st.success(f"Model set to {model_name}")
+        st.session_state.llm_settings = llm_settings
 
     st.divider()
     
@@ -97,14 +106,15 @@ with st.sidebar:
     # Simple Profile Editor
     new_name = st.text_input("Name", mm.profile.name)
     if new_name != mm.profile.name:
-        mm.profile.name = new_name
-        mm.save_profile()
+        # Hold the lock so a background reflection cannot swap the profile in between
+        with mm.lock:
+            mm.profile.name = new_name
+            mm.save_profile()
         st.rerun()
 
     from src.core.presets import DEMO_CHARACTER
     if st.button("Load Demo Character"):
-        mm.profile = DEMO_CHARACTER
-        mm.save_profile()
+        mm.replace_profile(DEMO_CHARACTER.model_copy(deep=True))
         st.rerun()
 
     with st.expander("Social Context"):
@@ -117,10 +127,22 @@ with st.sidebar:
         st.write(f"Health: {mm.profile.health.hp}")
         st.write(f"Wealth: {mm.profile.wealth.currency}")
 
+    with st.expander("Relationships"):
+        if not mm.profile.relationships:
+            st.caption("No relationships yet.")
+        for name, rel in mm.profile.relationships.items():
+            st.write(f"**{name}** (Affinity: {rel.affinity})")
+            if rel.tags:
+                st.caption(", ".join(rel.tags))
+            # Served from the entity index, no semantic search needed
+            for mem in mm.retrieve_entity_memories(name, n_results=3):
+                st.caption(f"- {mem['content']}")
+            st.divider()
+
     with st.expander("Daily Log"):
         # Debug Info
         st.caption(f"Total Entries: {len(mm.profile.daily_log)}")
-        st.caption(f"Profile Path: {os.path.abspath(mm.json_store.file_path)}")
+        st.caption(f"Profile Path: {os.path.abspath(mm.profile_store.file_path)}")
         
         for log in reversed(mm.profile.daily_log[-5:]):  # Show last 5
             st.caption(f"{log.timestamp.strftime('%Y-%m-%d %H:%M')}")
@@ -134,6 +156,15 @@ col1, col2 = st.columns([2, 1])
 
 with col1:
     st.subheader("💬 Chat with Character")
+
+    # Encounter: warm the first turn's retrieval for this player at the character's location
+    if st.session_state.get("prefetched_for") != user_name and not st.session_state.chat_history:
+        encounter_entity = user_name.strip() or None
+        encounter_location = mm.profile.context.current_location.strip() or None
+        # Nothing to warm without a name or a place (e.g. "Your Name" cleared on a new character)
+        if encounter_entity or encounter_location:
+            mm.prefetch(entity=encounter_entity, location=encounter_location)
+        st.session_state.prefetched_for = user_name
     
     # Display Chat History
     for msg in st.session_state.chat_history:
@@ -151,31 +182,35 @@ with col1:
         with st.chat_message("assistant"):
             # 1. Retrieve
             start_rag = time.time()
-            memories = mm.retrieve_relevant_memories(prompt, n_results=10)
+            memories = mm.retrieve_for_encounter(prompt, user_name, n_results=10)
             end_rag = time.time()
             rag_duration = end_rag - start_rag
             
             st.session_state.last_retrieval = memories
             st.session_state.last_rag_time = rag_duration
             
-            # Track latency for P95
-            st.session_state.rag_latencies.append(rag_duration * 1000)
+            # Track latency for P95, across all sessions
+            metrics.observe("rag_latency_ms", rag_duration * 1000)
             
             # 2. Prepare Stream
             context_str = "\n".join([f"- {m['content']}" for m in memories])
+            relationship = mm.relationship_summary(user_name)
+            if relationship:
+                context_str = f"{relationship}\n{context_str}"
             system_prompt = mm._construct_system_prompt(user_name=user_name, user_persona=user_persona)
             
-            # [Token Count] 1. Input Tokens Breakdown
-            history_str = "\n".join([f"{msg['role']}: {msg['content']}" for msg in st.session_state.chat_history])
+            conversation = st.session_state.conversation
+            messages = conversation.build_messages(system_prompt, prompt, context_str)
             
+            # [Token Count] 1. Input Tokens Breakdown
             t_system = estimate_tokens(system_prompt)
             t_context = estimate_tokens(context_str)
-            t_history = estimate_tokens(history_str)
+            t_history = conversation.history_tokens()
             t_prompt = estimate_tokens(prompt)
             
             input_tokens = t_system + t_context + t_history + t_prompt
 
-            stream = mm.llm_service.generate_response_stream(system_prompt, prompt, context_str)
+            stream = st.session_state.llm_service.generate_chat_stream(messages)
             
             # 3. Stream Output
             start_llm = time.time()
@@ -183,9 +218,13 @@ with col1:
             end_llm = time.time()
             llm_duration = end_llm - start_llm
             st.session_state.last_llm_time = llm_duration
+            metrics.observe("llm_latency_ms", llm_duration * 1000)
             
             # [Token Count] 2. Output Tokens
             output_tokens = estimate_tokens(response)
+            metrics.increment("turns")
+            metrics.increment("input_tokens", input_tokens)
+            metrics.increment("output_tokens", output_tokens)
             st.session_state.last_token_usage = {
                 "input_total": input_tokens, 
                 "output_total": output_tokens,
@@ -200,25 +239,33 @@ with col1:
         # 4. Save to History & Memory
         st.session_state.chat_history.append({"role": "assistant", "content": response})
         mm.save_interaction(prompt, response, user_name=user_name)
+        st.session_state.reflection_session.add_turn(prompt, response, user_name=user_name)
+        st.session_state.conversation.add_turn(prompt, response)
 
     # --- Reflection Trigger ---
     st.divider()
     if st.button("🛑 End Conversation & Reflect"):
-        with st.spinner("Reflecting on interaction..."):
-            # [Token Count] 3. Reflection Tokens
-            ref_input_str = str(st.session_state.chat_history)
-            ref_input_tokens = estimate_tokens(ref_input_str)
-
-            result = mm.reflect_on_interaction(st.session_state.chat_history, user_name=user_name)
-            
-            ref_output_tokens = estimate_tokens(result)
-            st.caption(f"Reflection Tokens (Est.): Input {ref_input_tokens} | Output {ref_output_tokens}")
+        # Queued in the background, the UI does not wait for the LLM
+        st.session_state.reflection_session.end(user_name=user_name)
+        st.toast("Reflection queued.")
+        # Clear history for next session
+        st.session_state.chat_history = []
+        st.session_state.conversation.reset()
+        st.session_state.prefetched_for = None
+        st.rerun()
 
-            st.success("Reflection Complete!")
-            st.info(result)
-            # Clear history for next session
-            st.session_state.chat_history = []
-            st.rerun()
+    engine = st.session_state.reflection_engine
+    recent_jobs = engine.recent_jobs(limit=3)
+    if recent_jobs:
+        with st.expander(f"🪞 Reflection ({engine.pending_count()} pending)"):
+            if st.button("Refresh Status"):
+                st.rerun()
+            for job in recent_jobs:
+                st.caption(f"{job.created_at.strftime('%H:%M:%S')} | {job.kind} | {job.status} (attempts: {job.attempts})")
+                if job.status == "done":
+                    st.info(job.result)
+                elif job.error:
+                    st.warning(job.error)
 
 with col2:
     st.subheader("🧠 Memory Inspector")
@@ -232,19 +279,15 @@ with col2:
         # 2. Storage
         db_size_mb = get_dir_size("data/chroma_db") / (1024 * 1024)
         
-        # 3. P95 Latency
-        if st.session_state.rag_latencies:
-            sorted_lats = sorted(st.session_state.rag_latencies)
-            idx = int(0.95 * len(sorted_lats))
-            idx = min(idx, len(sorted_lats) - 1)
-            p95_latency = sorted_lats[idx]
-        else:
-            p95_latency = 0.0
+        # 3. P95 Latency (all sessions)
+        p95_latency = metrics.percentile("rag_latency_ms", 0.95)
             
         ms_col1, ms_col2, ms_col3 = st.columns(3)
         ms_col1.metric("Entries", f"{mem_count}")
         ms_col2.metric("RAG P95", f"{p95_latency:.0f} ms")
         ms_col3.metric("Storage", f"{db_size_mb:.1f} MB")
+        st.caption(f"All sessions: {metrics.counter('sessions')} opened | {metrics.counter('turns')} turns | "
+                   f"LLM P95 {metrics.percentile('llm_latency_ms', 0.95):.0f} ms")
         
         st.divider()
     except Exception as e:
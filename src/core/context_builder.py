@@ -0,0 +1,116 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict
+
+# Simple token estimator (approx 4 chars per token)
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 if text else 0
+
+def _messages_tokens(messages: List[Dict]) -> int:
+    return sum(estimate_tokens(m["content"]) for m in messages)
+
+class ConversationContext:
+    """
+    Builds the message list for one conversation.
+
+    Layout, from most to least stable so provider-side prefix caching keeps hitting:
+      1. system prompt (cached by MemoryManager, re-rendered only when the profile changes)
+      2. rolling summary of older turns
+      3. sliding window of recent turns
+      4. retrieved memories + the new user input
+    Turns that fall out of the window are compressed into the summary in the background.
+    """
+    # Unsummarized turns kept for the summarizer, as a multiple of the history budget
+    PENDING_BUDGET_FACTOR = 4
+
+    def __init__(self, llm_service, window_turns: int = 6, history_token_budget: int = 1500, summary_token_budget: int = 300):
+        self.llm_service = llm_service
+        self.window_turns = window_turns
+        self.history_token_budget = history_token_budget
+        self.summary_token_budget = summary_token_budget
+        self.summary = ""
+        self._turns: List[Dict] = []
+        # Evicted from the window but not summarized yet; the newest ones are still sent
+        # (within the history budget) until they are
+        self._evicted: List[Dict] = []
+        self._compacting = False
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="context-summary")
+
+    def add_turn(self, user_input: str, ai_response: str):
+        with self._lock:
+            self._turns.append({"role": "user", "content": user_input})
+            self._turns.append({"role": "assistant", "content": ai_response})
+
+            # Slide the window by whole exchanges
+            while len(self._turns) > 2 and (
+                len(self._turns) > 2 * self.window_turns or _messages_tokens(self._turns) > self.history_token_budget
+            ):
+                self._evicted.extend(self._turns[:2])
+                self._turns = self._turns[2:]
+
+            # If summaries keep failing, forget the oldest pending turns rather than growing forever
+            while len(self._evicted) > 2 and _messages_tokens(self._evicted) > self.PENDING_BUDGET_FACTOR * self.history_token_budget:
+                self._evicted = self._evicted[2:]
+
+            if self._evicted and not self._compacting:
+                self._compacting = True
+                self._executor.submit(self._compact)
+
+    def _compact(self):
+        with self._lock:
+            evicted = list(self._evicted)
+            previous = self.summary
+            generation = self._generation
+
+        turns_str = "\n".join([f"{m['role']}: {m['content']}" for m in evicted])
+        summary = self.llm_service.generate_summary(
+            f"Earlier summary:\n{previous}\n\nNew turns:\n{turns_str}\n\n"
+            f"Keep it under {self.summary_token_budget * 4} characters."
+        )
+
+        with self._lock:
+            if generation != self._generation:
+                # Conversation was reset meanwhile
+                self._compacting = False
+                return
+            if summary and not summary.startswith("Error"):
+                # Enforce the budget even if the model ignores it
+                self.summary = summary.strip()[:self.summary_token_budget * 4]
+                # Some of them may have been dropped meanwhile
+                summarized = set(map(id, evicted))
+                self._evicted = [m for m in self._evicted if id(m) not in summarized]
+            self._compacting = False
+            # More turns may have been evicted meanwhile
+            if self._evicted and summary and not summary.startswith("Error"):
+                self._compacting = True
+                self._executor.submit(self._compact)
+
+    def history_messages(self) -> List[Dict]:
+        with self._lock:
+            messages = []
+            if self.summary:
+                messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{self.summary}"})
+            # Unsummarized turns only fill what the window leaves of the budget, newest first
+            room = self.history_token_budget - _messages_tokens(self._turns)
+            start = len(self._evicted)
+            while start >= 2 and _messages_tokens(self._evicted[start - 2:]) <= room:
+                start -= 2
+            return messages + self._evicted[start:] + list(self._turns)
+
+    def history_tokens(self) -> int:
+        return _messages_tokens(self.history_messages())
+
+    def build_messages(self, system_prompt: str, user_input: str, context: str = "") -> List[Dict]:
+        messages = [{"role": "system", "content": system_prompt}]
+        messages += self.history_messages()
+        messages.append({"role": "user", "content": f"Context:\n{context}\n\nUser: {user_input}"})
+        return messages
+
+    def reset(self):
+        with self._lock:
+            self.summary = ""
+            self._turns = []
+            self._evicted = []
+            self._generation += 1
@@ -1,78 +1,336 @@
+import copy
+import json
+import re
+import threading
 import uuid
 from datetime import datetime
-from typing import List, Dict
-from src.models.schema import CharacterProfile, MemoryItem, SocialContext, Personality, Wealth, Health
-from src.storage.json_store import JSONStore
+from typing import List, Dict, Tuple, Any, Optional
+from src.models.schema import CharacterProfile, MemoryItem, SocialContext, Personality, Wealth, Health, DailyLogEntry, Relationship, Skill
+from src.storage.json_store import JSONStore, ProfileConflictError
+from src.storage.binary_store import BinaryProfileStore
 from src.storage.vector_store import VectorStore
+from src.storage.reindex import Reindexer
 from src.services.llm_service import LLMService
+from src.core.context_builder import ConversationContext
+from src.core.prefetch import MemoryPrefetcher
+
+# Fields that are only ever appended to; merged by keeping both sides' additions
+_APPEND_ONLY_EXCLUDE = {"daily_log": True, "relationships": {"__all__": {"history"}}}
+
+def _profile_snapshot(profile: CharacterProfile) -> Dict[str, Any]:
+    """Merge base for optimistic saves. Append-only lists are recorded by length only."""
+    base = profile.model_dump(mode="json", exclude=_APPEND_ONLY_EXCLUDE)
+    base["_daily_log_len"] = len(profile.daily_log)
+    base["_history_lens"] = {name: len(rel.history) for name, rel in profile.relationships.items()}
+    return base
+
+def _merge_value(base: Any, ours: Any, theirs: Any) -> Any:
+    if ours == base:
+        return theirs
+    if isinstance(ours, dict) and isinstance(base, dict) and isinstance(theirs, dict):
+        merged = dict(theirs)
+        for key, value in ours.items():
+            merged[key] = _merge_value(base.get(key), value, theirs.get(key))
+        return merged
+    return ours
+
+def _merge_profiles(base: Dict[str, Any], ours: CharacterProfile, theirs: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Three-way merge of a locally modified profile onto the version another writer saved.
+    Our changes win on conflicting fields; daily_log and relationship histories keep both sides' entries.
+    """
+    ours_data = ours.model_dump(mode="json")
+    merged = dict(theirs)
+
+    # 1. Plain fields
+    for key, value in ours_data.items():
+        if key in ("daily_log", "relationships", "updated_at"):
+            continue
+        merged[key] = _merge_value(base.get(key), value, theirs.get(key))
+
+    # 2. Daily log is append-only
+    merged["daily_log"] = theirs.get("daily_log", []) + ours_data["daily_log"][base["_daily_log_len"]:]
+
+    # 3. Relationships, per target
+    relationships = dict(theirs.get("relationships", {}))
+    for name, rel in ours_data["relationships"].items():
+        their_rel = relationships.get(name)
+        if their_rel is None:
+            relationships[name] = rel
+            continue
+        base_rel = base["relationships"].get(name, {})
+        merged_rel = dict(their_rel)
+        for field, value in rel.items():
+            if field != "history":
+                merged_rel[field] = _merge_value(base_rel.get(field), value, their_rel.get(field))
+        new_history = rel["history"][base["_history_lens"].get(name, 0):]
+        merged_rel["history"] = their_rel.get("history", []) + new_history
+        relationships[name] = merged_rel
+    merged["relationships"] = relationships
+
+    return merged
+
+def _copy_for_update(profile: CharacterProfile) -> CharacterProfile:
+    """Copy that can be modified without touching `profile`. Logs are copied shallowly since entries are never edited."""
+    return profile.model_copy(update={
+        "context": profile.context.model_copy(deep=True),
+        "personality": profile.personality.model_copy(deep=True),
+        "skills": [s.model_copy() for s in profile.skills],
+        "relationships": {
+            name: rel.model_copy(update={"tags": list(rel.tags), "history": copy.copy(rel.history)})
+            for name, rel in profile.relationships.items()
+        },
+        "daily_log": copy.copy(profile.daily_log),
+    })
 
 class MemoryManager:
-    def __init__(self, profile_path: str, vector_db_path: str, llm_service: LLMService):
-        self.json_store = JSONStore(profile_path)
-        self.vector_store = VectorStore(vector_db_path)
+    # How many times a conflicting save is merged and retried before giving up
+    MAX_SAVE_RETRIES = 5
+
+    def __init__(self, profile_path: str, vector_db_path: str, llm_service: LLMService, embedding_function=None):
+        # ".bin" profiles use the compact binary format with lazily loaded logs
+        if profile_path.endswith(".bin"):
+            self.profile_store = BinaryProfileStore(profile_path)
+        else:
+            self.profile_store = JSONStore(profile_path)
+        # None uses Chroma's default model (or the one a re-index switched to)
+        self.vector_store = VectorStore(vector_db_path, embedding_function=embedding_function)
         self.llm_service = llm_service
+        # Guards profile mutations, which can also come from background reflection
+        self.lock = threading.RLock()
         self.profile = self._load_or_create_profile()
+        # Bumped on every save; keys the cached system prompt
+        self.profile_revision = 0
+        self._prompt_cache: Dict[Tuple[str, str], Tuple[int, str]] = {}
+        # Default conversation for chat(); callers serving several users pass their own
+        self.conversation = ConversationContext(llm_service)
+        # Warm retrieval for upcoming encounters
+        self.prefetcher = MemoryPrefetcher(self)
 
     def _load_or_create_profile(self) -> CharacterProfile:
-        data = self.json_store.load_profile()
-        if data:
-            return CharacterProfile(**data)
+        profile = self.profile_store.load_model()
+        if profile:
+            self._profile_version = profile.updated_at
+            self._profile_base = _profile_snapshot(profile)
+            return profile
         else:
             # Default empty profile
-            return CharacterProfile(
+            profile = CharacterProfile(
                 name="New Character",
                 context=SocialContext(world_view="", occupation="", current_location=""),
                 personality=Personality(traits={}, values=[]),
                 wealth=Wealth(),
                 health=Health()
             )
-
-
+            self._profile_version = None
+            self._profile_base = _profile_snapshot(profile)
+            return profile
 
     def save_profile(self):
-        self.json_store.save_profile(self.profile)
+        """
+        Saves the profile with optimistic versioning. If another worker saved in between,
+        our changes are merged onto theirs and the save is retried.
+        """
+        with self.lock:
+            for _ in range(self.MAX_SAVE_RETRIES):
+                try:
+                    self._profile_version = self.profile_store.save_profile(
+                        self.profile, expected_version=self._profile_version, check_version=True
+                    )
+                    self._profile_base = _profile_snapshot(self.profile)
+                    self.profile_revision += 1
+                    return
+                except ProfileConflictError:
+                    theirs = self.profile_store.load_profile()
+                    merged = _merge_profiles(self._profile_base, self.profile, theirs)
+                    self.profile = CharacterProfile(**merged)
+                    self._profile_version = self.profile.updated_at
+                    self._profile_base = _profile_snapshot(CharacterProfile(**theirs))
+            raise ProfileConflictError(f"Could not save profile after {self.MAX_SAVE_RETRIES} attempts.")
+
+    def replace_profile(self, profile: CharacterProfile):
+        """Overwrites the stored profile (e.g. loading a preset or restoring a snapshot), without merging."""
+        with self.lock:
+            self._profile_version = self.profile_store.save_profile(profile)
+            self._profile_base = _profile_snapshot(profile)
+            self.profile = profile
+            self.profile_revision += 1
 
     def update_memory(self, id: str, content: str, type: str, importance: int):
-        self.vector_store.update_memory(id, content, type, importance)
+        # Partial: unchanged content is not re-embedded
+        self.vector_store.update_memory(id, content=content, type=type, importance=importance)
+
+    def update_memories(self, ids: List[str], contents: Optional[List[Optional[str]]] = None, metadatas: Optional[List[Dict]] = None) -> int:
+        """Bulk partial updates (e.g. importance decay). Returns how many memories were re-embedded."""
+        return self.vector_store.update_many(ids, contents=contents, metadatas=metadatas)
 
     def delete_memory(self, id: str):
         self.vector_store.delete_memory(id)
 
-    def retrieve_relevant_memories(self, query: str, n_results: int = 10) -> List[Dict]:
-        return self.vector_store.search(query, n_results=n_results)
+    def retrieve_relevant_memories(self, query: str, n_results: int = 10, entity: Optional[str] = None) -> List[Dict]:
+        return self.vector_store.search(query, n_results=n_results, entity=entity)
+
+    def retrieve_entity_memories(self, entity: str, n_results: int = 10) -> List[Dict]:
+        """Memories about a specific person (or place), straight from the entity index."""
+        return self.vector_store.get_by_entity(entity, limit=n_results)
+
+    def prefetch(self, entity: Optional[str] = None, location: Optional[str] = None):
+        """
+        Call on proximity / encounter events: warms the first turn's retrieval for `entity`
+        (and `location`) in the background. Returns a Future of the warm set.
+        """
+        return self.prefetcher.prefetch(entity=entity, location=location)
+
+    def retrieve_for_encounter(self, query: str, entity: str, n_results: int = 10) -> List[Dict]:
+        """Relevant memories for a turn with `entity`: from its prefetched set if still fresh, else a regular search."""
+        warm = self.prefetcher.search(query, entity, n_results=n_results)
+        if warm is not None:
+            return warm
+        return self.retrieve_relevant_memories(query, n_results=n_results)
+
+    def relationship_summary(self, entity: str) -> str:
+        """One-line summary of the relationship with `entity`, empty if there is none."""
+        # Prefetched with the encounter, as long as the profile has not changed since
+        warm = self.prefetcher.get(entity)
+        if warm is not None and warm.profile_revision == self.profile_revision:
+            return warm.relationship_summary
+        rel = next((r for name, r in self.profile.relationships.items() if name.casefold() == entity.casefold()), None)
+        if rel is None:
+            return ""
+        summary = f"Relationship with {rel.target_name}: affinity {rel.affinity}"
+        if rel.tags:
+            summary += f" ({', '.join(rel.tags)})"
+        if rel.history:
+            summary += f". Recently: {'; '.join(rel.history[-3:])}"
+        return summary
+
+    def start_reindex(self, embedding_function, batch_size: int = 256, workers: int = 2, throttle: float = 0.0,
+                      keep_old: bool = True) -> Reindexer:
+        """
+        Re-embeds every memory with a new model in the background while the character stays live.
+        Resumes an interrupted re-index to the same model. The old collection is kept unless
+        `keep_old` is False, for processes that have not restarted yet. See src.storage.reindex.
+        """
+        reindexer = Reindexer(self.vector_store, embedding_function, batch_size=batch_size, workers=workers,
+                              throttle=throttle, keep_old=keep_old)
+        reindexer.run_in_background()
+        return reindexer
+
+    def known_entities(self) -> List[str]:
+        """Relationship targets and the character's current location."""
+        entities = list(self.profile.relationships.keys())
+        if self.profile.context.current_location.strip():
+            entities.append(self.profile.context.current_location)
+        return entities
+
+    def detect_entities(self, text: str) -> List[str]:
+        """Known entities (relationship targets) mentioned in the text."""
+        # Whole words only, so "Al" does not match "also"
+        return [
+            name for name in self.known_entities()
+            if name.strip() and re.search(rf"(?<!\w){re.escape(name.strip())}(?!\w)", text, re.IGNORECASE)
+        ]
+
+    def _tag_entities(self, text: str, speakers: List[str]) -> List[str]:
+        entities = []
+        for name in list(speakers) + self.detect_entities(text):
+            if name and name.strip() and name.casefold() not in [e.casefold() for e in entities]:
+                entities.append(name)
+        return entities
+
+    @staticmethod
+    def retrieve_many(requests: List[Tuple["MemoryManager", str, int]]) -> List[List[Dict]]:
+        """
+        Batched retrieval for many characters (e.g. a world tick).
+        Embeds all queries in one call per embedding function and issues one
+        multi-query call per collection. Results are returned in request order.
+        """
+        results: List[List[Dict]] = [[] for _ in requests]
+        if not requests:
+            return results
+
+        # 1. Embed all queries, one batch per (shared) embedding function
+        embeddings: List[List[float]] = [None] * len(requests)
+        by_embedder: Dict[int, List[int]] = {}
+        for i, (mm, _, _) in enumerate(requests):
+            by_embedder.setdefault(id(mm.vector_store.embedding_function), []).append(i)
+        for indices in by_embedder.values():
+            store = requests[indices[0]][0].vector_store
+            vectors = store.embed([requests[i][1] for i in indices])
+            for i, vector in zip(indices, vectors):
+                embeddings[i] = vector
+
+        # 2. One multi-query call per collection, then hand results back to each character
+        by_store: Dict[int, List[int]] = {}
+        for i, (mm, _, _) in enumerate(requests):
+            by_store.setdefault(id(mm.vector_store), []).append(i)
+        for indices in by_store.values():
+            store = requests[indices[0]][0].vector_store
+            n_max = max(requests[i][2] for i in indices)
+            batch = store.search_many([embeddings[i] for i in indices], n_results=n_max)
+            for i, found in zip(indices, batch):
+                results[i] = found[:requests[i][2]]
+
+        return results
 
     def save_interaction(self, user_input: str, ai_response: str, user_name: str = "User"):
         user_mem = MemoryItem(
             id=str(uuid.uuid4()),
             type="observation",
             content=f"{user_name} said: {user_input}",
-            importance=1
+            importance=1,
+            # Interactions are also tagged with where they happened, for location prefetch
+            related_entities=self._tag_entities(user_input, [user_name, self.profile.context.current_location])
         )
         ai_mem = MemoryItem(
             id=str(uuid.uuid4()),
             type="action",
             content=f"I replied to {user_name}: {ai_response}",
-            importance=1
+            importance=1,
+            related_entities=self._tag_entities(ai_response, [user_name, self.profile.context.current_location])
         )
         self.vector_store.add_memories([user_mem, ai_mem])
 
-    def chat(self, user_input: str) -> tuple[str, List[Dict]]:
-        # 1. Retrieve relevant memories
-        relevant_memories = self.retrieve_relevant_memories(user_input)
+    def chat(self, user_input: str, user_name: str = "User", conversation: Optional[ConversationContext] = None) -> tuple[str, List[Dict]]:
+        conversation = conversation or self.conversation
+
+        # 1. Retrieve relevant memories (prefetched ones on the first turn of an encounter)
+        relevant_memories = self.retrieve_for_encounter(user_input, user_name)
         context_str = "\n".join([f"- {m['content']}" for m in relevant_memories])
+        relationship = self.relationship_summary(user_name)
+        if relationship:
+            context_str = f"{relationship}\n{context_str}"
 
-        # 2. Construct System Prompt from Profile
-        system_prompt = self._construct_system_prompt()
+        # 2. Construct System Prompt from Profile (cached) plus prior turns
+        system_prompt = self._construct_system_prompt(user_name=user_name)
+        messages = conversation.build_messages(system_prompt, user_input, context_str)
 
         # 3. Generate Response
-        response = self.llm_service.generate_response(system_prompt, user_input, context_str)
+        response = self.llm_service.generate_chat(messages)
 
         # 4. Store interaction
-        self.save_interaction(user_input, response)
+        self.save_interaction(user_input, response, user_name=user_name)
+        conversation.add_turn(user_input, response)
 
         return response, relevant_memories
 
     def _construct_system_prompt(self, user_name: str = "User", user_persona: str = "") -> str:
+        """
+        Rendered once per profile revision and user, so the prompt prefix stays
+        byte-identical across turns and provider-side prefix caching can hit.
+        """
+        key = (user_name, user_persona)
+        cached = self._prompt_cache.get(key)
+        if cached and cached[0] == self.profile_revision:
+            return cached[1]
+
+        if len(self._prompt_cache) >= 64:
+            self._prompt_cache.clear()
+        prompt = self._render_system_prompt(user_name, user_persona)
+        self._prompt_cache[key] = (self.profile_revision, prompt)
+        return prompt
+
+    def _render_system_prompt(self, user_name: str, user_persona: str) -> str:
         p = self.profile
         return f"""You are {p.name}.
 Context: {p.context.world_view}. You are a {p.context.occupation} at {p.context.current_location}.
@@ -87,13 +345,29 @@ Respond naturally based on your memory and current state."""
     def reflect_on_interaction(self, chat_history: List[Dict], user_name: str = "User") -> str:
         """
         Analyzes the chat history to update the character's profile (mood, relationships, daily log).
+        Blocking; see src.core.reflection for the incremental background variant.
         """
         if not chat_history:
             return "No interaction to reflect on."
 
+        response = ""
+        try:
+            data, response = self.request_reflection(chat_history, user_name)
+            updates = self.apply_reflection(data)
+            return "\n".join(updates) if updates else "No significant changes."
+        except Exception as e:
+            return f"Failed to process reflection: {str(e)}\nRaw Response: {response}"
+
+    def request_reflection(self, chat_history: List[Dict], user_name: str = "User", previous_notes: str = "", llm_service: Optional[LLMService] = None) -> Tuple[Dict, str]:
+        """
+        Asks the LLM for the state changes implied by `chat_history`.
+        Returns (parsed updates, raw response); raises ValueError if the response is not valid JSON.
+        """
         # 1. Prepare Context
         history_str = "\n".join([f"{msg['role']}: {msg['content']}" for msg in chat_history])
-        current_profile = self.profile.model_dump_json()
+        # Logs and relationship histories only grow, keep them out so the prompt stays bounded
+        current_profile = self.profile.model_dump_json(exclude=_APPEND_ONLY_EXCLUDE)
+        notes_str = f"\n        Earlier in this same conversation: {previous_notes}\n" if previous_notes else ""
         
         # 2. Construct Prompt
         prompt = f"""
@@ -103,7 +377,7 @@ Respond naturally based on your memory and current state."""
         
         Current Profile (JSON):
         {current_profile}
-        
+        {notes_str}
         Interaction History:
         {history_str}
         
@@ -138,57 +412,57 @@ Respond naturally based on your memory and current state."""
         """
         
         # 3. Call LLM
-        response = self.llm_service.generate_response("You are a backend system that manages character state. Output only JSON.", prompt)
+        response = (llm_service or self.llm_service).generate_response("You are a backend system that manages character state. Output only JSON.", prompt, task="reflection")
         
-        # 4. Parse and Apply Updates
+        # 4. Parse
+        cleaned = response
+        # Clean response if it contains markdown code blocks
+        if "```json" in cleaned:
+            cleaned = cleaned.split("```json")[1].split("```")[0]
+        elif "```" in cleaned:
+            cleaned = cleaned.split("```")[1].split("```")[0]
+
         try:
-            import json
-            # Clean response if it contains markdown code blocks
-            if "```json" in response:
-                response = response.split("```json")[1].split("```")[0]
-            elif "```" in response:
-                response = response.split("```")[1].split("```")[0]
-                
-            data = json.loads(response.strip())
-            
+            data = json.loads(cleaned.strip())
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Reflection response is not valid JSON: {e}") from e
+        if not isinstance(data, dict):
+            raise ValueError("Reflection response is not a JSON object.")
+        return data, response
+
+    def apply_reflection(self, data: Dict) -> List[str]:
+        """
+        Applies parsed reflection updates transactionally: changes are made on a copy of the
+        profile, which replaces the live one only once it has been saved.
+        """
+        with self.lock:
+            profile = _copy_for_update(self.profile)
             updates = []
-            
+            log_entry = None
+
             # Update Daily Log
             if "daily_log" in data:
-                from src.models.schema import DailyLogEntry
                 log_entry = DailyLogEntry(
                     activity=data["daily_log"]["activity"],
                     interacted_with=data["daily_log"].get("interacted_with", [])
                 )
-                self.profile.daily_log.append(log_entry)
-                
-                # ALSO save to Vector Store for RAG
-                log_memory = MemoryItem(
-                    id=str(uuid.uuid4()),
-                    type="daily_log",
-                    content=f"Daily Log ({datetime.now().strftime('%Y-%m-%d')}): {log_entry.activity}. Interacted with: {', '.join(log_entry.interacted_with)}",
-                    importance=8, # High importance for daily summaries
-                    summary=log_entry.activity # Use activity as summary
-                )
-                self.vector_store.add_memories([log_memory])
-                
+                profile.daily_log.append(log_entry)
                 updates.append("Added daily log entry (and saved to long-term memory).")
-                
+
             # Update Mood
-            if "mood" in data and data["mood"] != self.profile.personality.mood:
-                old_mood = self.profile.personality.mood
-                self.profile.personality.mood = data["mood"]
+            if "mood" in data and data["mood"] != profile.personality.mood:
+                old_mood = profile.personality.mood
+                profile.personality.mood = data["mood"]
                 updates.append(f"Mood changed from {old_mood} to {data['mood']}.")
-                
+
             # Update Relationships
             if "relationships" in data:
-                from src.models.schema import Relationship
                 for name, rel_data in data["relationships"].items():
-                    if name not in self.profile.relationships:
-                        self.profile.relationships[name] = Relationship(target_name=name)
+                    if name not in profile.relationships:
+                        profile.relationships[name] = Relationship(target_name=name)
                         updates.append(f"New relationship with {name}.")
-                    
-                    rel = self.profile.relationships[name]
+
+                    rel = profile.relationships[name]
                     if "affinity" in rel_data:
                         rel.affinity = rel_data["affinity"]
                     if "tags" in rel_data:
@@ -198,10 +472,9 @@ Respond naturally based on your memory and current state."""
 
             # Update Skills
             if "skills_update" in data and data["skills_update"]:
-                from src.models.schema import Skill
                 for skill_data in data["skills_update"]:
                     # Check if skill exists
-                    existing_skill = next((s for s in self.profile.skills if s.name == skill_data["name"]), None)
+                    existing_skill = next((s for s in profile.skills if s.name == skill_data["name"]), None)
                     if existing_skill:
                         existing_skill.level = skill_data["level"]
                         existing_skill.description = skill_data["description"]
@@ -212,37 +485,66 @@ Respond naturally based on your memory and current state."""
                             level=skill_data["level"],
                             description=skill_data["description"]
                         )
-                        self.profile.skills.append(new_skill)
+                        profile.skills.append(new_skill)
                         updates.append(f"Learned new skill: {skill_data['name']}.")
 
             # Update Personality
             if "personality_update" in data:
                 p_update = data["personality_update"]
                 if "traits" in p_update:
-                    self.profile.personality.traits.update(p_update["traits"])
+                    profile.personality.traits.update(p_update["traits"])
                     updates.append("Updated personality traits.")
                 if "values" in p_update:
                     # Merge values uniquely
-                    current_values = set(self.profile.personality.values)
+                    current_values = set(profile.personality.values)
                     new_values = set(p_update["values"])
-                    self.profile.personality.values = list(current_values.union(new_values))
+                    profile.personality.values = list(current_values.union(new_values))
                     updates.append("Updated values.")
 
             # Update Context
             if "context_update" in data:
                 c_update = data["context_update"]
                 if "occupation" in c_update and c_update["occupation"]:
-                    self.profile.context.occupation = c_update["occupation"]
+                    profile.context.occupation = c_update["occupation"]
                     updates.append(f"Occupation changed to {c_update['occupation']}.")
                 if "current_location" in c_update and c_update["current_location"]:
-                    self.profile.context.current_location = c_update["current_location"]
+                    profile.context.current_location = c_update["current_location"]
                     updates.append(f"Moved to {c_update['current_location']}.")
-                        
+
+            self._commit_profile(profile)
+
+        # ALSO save the daily log to Vector Store for RAG, once the profile is committed
+        if log_entry:
+            self._add_daily_log_memory(log_entry)
+        return updates
+
+    def record_daily_log(self, activity: str, interacted_with: List[str]) -> DailyLogEntry:
+        """Appends a daily log entry (e.g. merged from incremental reflections) and indexes it."""
+        log_entry = DailyLogEntry(activity=activity, interacted_with=interacted_with)
+        with self.lock:
+            profile = _copy_for_update(self.profile)
+            profile.daily_log.append(log_entry)
+            self._commit_profile(profile)
+        self._add_daily_log_memory(log_entry)
+        return log_entry
+
+    def _add_daily_log_memory(self, log_entry: DailyLogEntry):
+        log_memory = MemoryItem(
+            id=str(uuid.uuid4()),
+            type="daily_log",
+            content=f"Daily Log ({log_entry.timestamp.strftime('%Y-%m-%d')}): {log_entry.activity}. Interacted with: {', '.join(log_entry.interacted_with)}",
+            importance=8, # High importance for daily summaries
+            summary=log_entry.activity, # Use activity as summary
+            related_entities=self._tag_entities(log_entry.activity, list(log_entry.interacted_with) + [self.profile.context.current_location])
+        )
+        self.vector_store.add_memories([log_memory])
+
+    def _commit_profile(self, profile: CharacterProfile):
+        # Swap in the updated profile; roll back if it cannot be saved
+        previous = (self.profile, self._profile_version, self._profile_base)
+        self.profile = profile
+        try:
             self.save_profile()
-            return "\n".join(updates) if updates else "No significant changes."
-            
-        except Exception as e:
-            return f"Failed to process reflection: {str(e)}\nRaw Response: {response}"
-    
-    def save_profile(self):
-        self.json_store.save_profile(self.profile)
\ No newline at end of file
+        except Exception:
+            self.profile, self._profile_version, self._profile_base = previous
+            raise
@@ -0,0 +1,54 @@
+import threading
+from collections import deque
+from typing import Dict
+
+class MetricsRegistry:
+    """
+    Process-wide counters and latency samples, shared by every session / thread.
+    Each series keeps its most recent `window` samples for percentiles, plus totals.
+    """
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._samples: Dict[str, deque] = {}
+        self._totals: Dict[str, float] = {}
+        self._counts: Dict[str, int] = {}
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, value: float):
+        with self._lock:
+            self._samples.setdefault(name, deque(maxlen=self.window)).append(value)
+            self._totals[name] = self._totals.get(name, 0.0) + value
+            self._counts[name] = self._counts.get(name, 0) + 1
+
+    def increment(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def counter(self, name: str) -> int:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def percentile(self, name: str, p: float) -> float:
+        with self._lock:
+            values = sorted(self._samples.get(name, ()))
+        if not values:
+            return 0.0
+        return values[min(int(p * len(values)), len(values) - 1)]
+
+    def mean(self, name: str) -> float:
+        with self._lock:
+            count = self._counts.get(name, 0)
+            return self._totals.get(name, 0.0) / count if count else 0.0
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            series = {name: {"count": self._counts[name], "mean": self._totals[name] / self._counts[name]} for name in self._counts}
+            counters = dict(self._counters)
+        for name in series:
+            series[name]["p50"] = self.percentile(name, 0.5)
+            series[name]["p95"] = self.percentile(name, 0.95)
+        return {"series": series, "counters": counters}
+
+# Shared by the whole process
+metrics = MetricsRegistry()
@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Dict, Optional
+import numpy as np
+from src.storage.entity_index import normalize_entity
+
+class WarmSet:
+    """An encounter's memories with their embeddings, ready to be scored in-process."""
+    def __init__(self, key: str, memories: List[Dict], revision: int, relationship_summary: str = "", profile_revision: int = 0):
+        self.key = key
+        self.memories = memories
+        self.matrix = np.array([m.pop("embedding") for m in memories], dtype=np.float32) if memories else None
+        # Store revision the set was read at; any later write makes it stale
+        self.revision = revision
+        self.relationship_summary = relationship_summary
+        # Profile revision the summary was rendered at
+        self.profile_revision = profile_revision
+        self.created_at = time.time()
+
+class MemoryPrefetcher:
+    """
+    Warms retrieval for an upcoming encounter (a player approaching an NPC, or entering a location).
+
+    `prefetch` reads the memories tagged with the entity and/or location from the entity index, along
+    with their stored embeddings, in the background. The first turn of the encounter is then scored
+    against that set with one matrix product instead of a cold collection query. A set is only used
+    while the vector store has not been written since it was built, so results never miss new memories.
+    """
+    def __init__(self, memory_manager, per_entity: int = 50, max_sets: int = 16, ttl: float = 600.0):
+        self.memory_manager = memory_manager
+        self.per_entity = per_entity
+        self.max_sets = max_sets
+        self.ttl = ttl
+        self._sets: "OrderedDict[str, WarmSet]" = OrderedDict()
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="memory-prefetch")
+
+    def prefetch(self, entity: Optional[str] = None, location: Optional[str] = None) -> Future:
+        """Builds the warm set for `entity` (or `location` alone) in the background."""
+        key = normalize_entity(entity or location or "")
+        if not key:
+            raise ValueError("prefetch needs an entity or a location.")
+
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending and not pending.done():
+                return pending
+            future = self._executor.submit(self._build, key, entity, location)
+            self._pending[key] = future
+        return future
+
+    def _build(self, key: str, entity: Optional[str], location: Optional[str]) -> WarmSet:
+        mm = self.memory_manager
+        vs = mm.vector_store
+        revision = vs.revision
+
+        # 1. Top memories of the entity and the place, most important then most recent
+        ids = []
+        for name in (entity, location):
+            if name:
+                ids.extend(i for i in vs.entity_index.get_memory_ids(name) if i not in ids)
+        memories = vs.get_with_embeddings(ids)
+        memories.sort(key=lambda m: (m["metadata"].get("importance", 0), m["metadata"].get("timestamp", "")), reverse=True)
+        memories = memories[:self.per_entity * (2 if entity and location else 1)]
+
+        # 2. Relationship summary, and the embedding model (loaded lazily) plus the entity names
+        profile_revision = mm.profile_revision
+        summary = mm.relationship_summary(entity) if entity else ""
+        vs.embed([name for name in (entity, location) if name])
+
+        warm = WarmSet(key, memories, revision, relationship_summary=summary, profile_revision=profile_revision)
+        with self._lock:
+            self._sets[key] = warm
+            self._sets.move_to_end(key)
+            while len(self._sets) > self.max_sets:
+                self._sets.popitem(last=False)
+            self._pending.pop(key, None)
+        return warm
+
+    def get(self, entity: str) -> Optional[WarmSet]:
+        """The entity's warm set if it is still fresh."""
+        key = normalize_entity(entity or "")
+        with self._lock:
+            warm = self._sets.get(key)
+            if warm is None:
+                return None
+            if warm.revision != self.memory_manager.vector_store.revision or time.time() - warm.created_at > self.ttl:
+                del self._sets[key]
+                return None
+            return warm
+
+    def search(self, query: str, entity: str, n_results: int = 10) -> Optional[List[Dict]]:
+        """Scores the warm set of `entity` against the query. None if there is no usable warm set."""
+        warm = self.get(entity)
+        if warm is None or warm.matrix is None:
+            return None
+
+        q = np.array(self.memory_manager.vector_store.embed([query])[0], dtype=np.float32)
+        # Squared L2, the collection's own distance
+        distances = np.sum((warm.matrix - q) ** 2, axis=1)
+        order = np.argsort(distances)[:n_results]
+        return [dict(warm.memories[i], distance=float(distances[i])) for i in order]
+
+    def invalidate(self, entity: Optional[str] = None):
+        with self._lock:
+            if entity is None:
+                self._sets.clear()
+            else:
+                self._sets.pop(normalize_entity(entity), None)
@@ -0,0 +1,216 @@
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import List, Dict, Optional
+from pydantic import BaseModel, Field
+
+class ReflectionJob(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    kind: str = Field(..., description="'reflect' (LLM call over new turns) or 'finalize' (write the merged daily log)")
+    conversation_id: str
+    user_name: str = "User"
+    turns: List[Dict] = Field(default=[])
+    status: str = Field(default="pending", description="pending, running, done or failed")
+    attempts: int = 0
+    result: str = ""
+    error: str = ""
+    created_at: datetime = Field(default_factory=datetime.now)
+    finished_at: Optional[datetime] = None
+
+class ReflectionEngine:
+    """
+    Background reflection queue for one MemoryManager.
+    Each 'reflect' job sends only a handful of new turns to the LLM and applies the resulting
+    state changes right away. The daily log deltas of a conversation are merged and written as
+    a single entry by its 'finalize' job. Jobs run one at a time, in submission order.
+    Sessions left idle for `idle_timeout` seconds (e.g. a closed browser tab) are ended by the
+    worker, so their buffered turns are reflected on and their daily log is still written.
+    """
+    def __init__(self, memory_manager, max_retries: int = 2, retry_delay: float = 2.0, max_history: int = 50,
+                 idle_timeout: float = 1800.0):
+        self.memory_manager = memory_manager
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.max_history = max_history
+        self.idle_timeout = idle_timeout
+        # Open sessions by conversation id, ended by the worker once idle
+        self._sessions: Dict[str, "ReflectionSession"] = {}
+        self._queue: "queue.Queue[ReflectionJob]" = queue.Queue()
+        self._jobs: Dict[str, ReflectionJob] = {}
+        self._conversations: Dict[str, Dict] = {}
+        # Per-conversation LLM override (a session's own API key / model)
+        self._llm_services: Dict[str, object] = {}
+        self._lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, name="reflection-worker", daemon=True)
+        self._worker.start()
+
+    def submit(self, conversation_id: str, turns: List[Dict], user_name: str = "User", llm_service=None) -> str:
+        if llm_service is not None:
+            with self._lock:
+                self._llm_services[conversation_id] = llm_service
+        return self._submit(ReflectionJob(kind="reflect", conversation_id=conversation_id, turns=list(turns), user_name=user_name))
+
+    def finalize(self, conversation_id: str, user_name: str = "User") -> str:
+        return self._submit(ReflectionJob(kind="finalize", conversation_id=conversation_id, user_name=user_name))
+
+    def _submit(self, job: ReflectionJob) -> str:
+        with self._lock:
+            self._jobs[job.id] = job
+            # Forget the oldest finished jobs
+            finished = [j.id for j in self._jobs.values() if j.status in ("done", "failed")]
+            for job_id in finished[:max(0, len(self._jobs) - self.max_history)]:
+                del self._jobs[job_id]
+        self._queue.put(job)
+        return job.id
+
+    def get_job(self, job_id: str) -> Optional[ReflectionJob]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.model_copy() if job else None
+
+    def recent_jobs(self, limit: int = 5) -> List[ReflectionJob]:
+        with self._lock:
+            jobs = sorted(self._jobs.values(), key=lambda j: j.created_at, reverse=True)
+            return [j.model_copy() for j in jobs[:limit]]
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return sum(1 for j in self._jobs.values() if j.status in ("pending", "running"))
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Blocks until the queue is drained. Returns False on timeout."""
+        deadline = time.time() + timeout if timeout is not None else None
+        while self.pending_count():
+            if deadline is not None and time.time() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def track(self, session: "ReflectionSession"):
+        with self._lock:
+            self._sessions[session.conversation_id] = session
+
+    def untrack(self, session: "ReflectionSession"):
+        with self._lock:
+            if self._sessions.get(session.conversation_id) is session:
+                del self._sessions[session.conversation_id]
+
+    def end_idle_sessions(self) -> List[str]:
+        """Ends the sessions idle for longer than `idle_timeout`. Returns their finalize job ids."""
+        now = time.time()
+        with self._lock:
+            idle = [s for s in self._sessions.values() if now - s.last_activity > self.idle_timeout]
+        return [session.end(session.user_name) for session in idle]
+
+    def _run(self):
+        last_check = time.time()
+        while True:
+            try:
+                job = self._queue.get(timeout=min(60.0, self.idle_timeout))
+            except queue.Empty:
+                job = None
+            if job is not None:
+                try:
+                    self._process(job)
+                finally:
+                    self._queue.task_done()
+            if time.time() - last_check >= min(60.0, self.idle_timeout):
+                last_check = time.time()
+                self.end_idle_sessions()
+
+    def _process(self, job: ReflectionJob):
+        while True:
+            self._set(job, status="running", attempts=job.attempts + 1)
+            try:
+                if job.kind == "finalize":
+                    result = self._finalize(job)
+                else:
+                    result = self._reflect(job)
+                self._set(job, status="done", result=result, error="", finished_at=datetime.now())
+                return
+            except Exception as e:
+                if job.attempts > self.max_retries:
+                    self._set(job, status="failed", error=str(e), finished_at=datetime.now())
+                    return
+                self._set(job, status="pending", error=str(e))
+                time.sleep(self.retry_delay * job.attempts)
+
+    def _reflect(self, job: ReflectionJob) -> str:
+        mm = self.memory_manager
+        conversation = self._conversations.setdefault(job.conversation_id, {"activities": [], "interacted_with": []})
+
+        with self._lock:
+            llm_service = self._llm_services.get(job.conversation_id)
+        data, _ = mm.request_reflection(job.turns, job.user_name, previous_notes=" ".join(conversation["activities"]), llm_service=llm_service)
+
+        # The daily log is merged across the conversation and written on finalize
+        log = data.pop("daily_log", None)
+        updates = mm.apply_reflection(data)
+        if log and log.get("activity"):
+            conversation["activities"].append(log["activity"])
+            for name in log.get("interacted_with", []):
+                if name not in conversation["interacted_with"]:
+                    conversation["interacted_with"].append(name)
+            updates.append("Noted for the daily log.")
+        return "\n".join(updates) if updates else "No significant changes."
+
+    def _finalize(self, job: ReflectionJob) -> str:
+        conversation = self._conversations.pop(job.conversation_id, None)
+        with self._lock:
+            self._llm_services.pop(job.conversation_id, None)
+        if not conversation or not conversation["activities"]:
+            return "Nothing to add to the daily log."
+        self.memory_manager.record_daily_log(" ".join(conversation["activities"]), conversation["interacted_with"])
+        return "Added daily log entry (and saved to long-term memory)."
+
+    def _set(self, job: ReflectionJob, **changes):
+        with self._lock:
+            for key, value in changes.items():
+                setattr(job, key, value)
+
+class ReflectionSession:
+    """
+    Per-conversation turn buffer. Every `every_n_turns` exchanges, the new turns are handed
+    to the engine; ending the conversation flushes the rest and returns immediately.
+    The engine ends the conversation itself if no turn is added for its `idle_timeout`.
+    """
+    def __init__(self, engine: ReflectionEngine, every_n_turns: int = 6, llm_service=None):
+        self.engine = engine
+        self.every_n_turns = every_n_turns
+        # None uses the engine's MemoryManager service
+        self.llm_service = llm_service
+        self.conversation_id = str(uuid.uuid4())
+        self.user_name = "User"
+        self.last_activity = time.time()
+        self._pending: List[Dict] = []
+        # The engine's worker may end the session while the UI adds a turn
+        self._lock = threading.RLock()
+
+    def add_turn(self, user_input: str, ai_response: str, user_name: str = "User") -> Optional[str]:
+        with self._lock:
+            self._pending.append({"role": "user", "content": user_input})
+            self._pending.append({"role": "assistant", "content": ai_response})
+            self.user_name = user_name
+            self.last_activity = time.time()
+            self.engine.track(self)
+            if len(self._pending) >= 2 * self.every_n_turns:
+                return self.flush(user_name)
+            return None
+
+    def flush(self, user_name: str = "User") -> Optional[str]:
+        with self._lock:
+            if not self._pending:
+                return None
+            job_id = self.engine.submit(self.conversation_id, self._pending, user_name, llm_service=self.llm_service)
+            self._pending = []
+            return job_id
+
+    def end(self, user_name: str = "User") -> str:
+        with self._lock:
+            self.flush(user_name)
+            self.engine.untrack(self)
+            job_id = self.engine.finalize(self.conversation_id, user_name)
+            self.conversation_id = str(uuid.uuid4())
+            return job_id
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_serializer
 from typing import List, Dict, Optional
 from datetime import datetime
 
@@ -22,6 +22,11 @@ class Relationship(BaseModel):
     tags: List[str] = Field(default=[], description="Tags like 'Friend', 'Enemy'")
     history: List[str] = Field(default=[], description="Key interaction summary")
 
+    @field_serializer("history", mode="wrap")
+    def _serialize_history(self, value, handler):
+        # May be a lazily decoded sequence when loaded from a binary profile
+        return handler(list(value))
+
 # 4. Wealth
 class Wealth(BaseModel):
     currency: float = Field(default=0.0)
@@ -57,6 +62,11 @@ class CharacterProfile(BaseModel):
     daily_log: List[DailyLogEntry] = Field(default=[])
     updated_at: datetime = Field(default_factory=datetime.now)
 
+    @field_serializer("daily_log", mode="wrap")
+    def _serialize_daily_log(self, value, handler):
+        # May be a lazily decoded sequence when loaded from a binary profile
+        return handler(list(value))
+
 # --- Memory Stream Item ---
 class MemoryItem(BaseModel):
     id: str
@@ -0,0 +1,149 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Dict, Optional
+import httpx
+from openai import OpenAI
+from pydantic import BaseModel, Field
+
+TASKS = ("chat", "reflection", "summary", "consolidation")
+
+class SlotTimeout(TimeoutError):
+    """No concurrency slot freed up in time. Contention, not a sign the model is unhealthy."""
+    pass
+
+class ModelProfile(BaseModel):
+    model: Optional[str] = Field(default=None, description="None uses the service's current model")
+    base_url: Optional[str] = Field(default=None, description="None uses the service's endpoint")
+    api_key: Optional[str] = Field(default=None, description="None uses the service's API key")
+    timeout: float = Field(default=60.0, description="Whole request timeout (s)")
+    first_token_timeout: Optional[float] = Field(default=None, description="Streamed requests only: max wait for the first token / between reads (s)")
+    latency_slo: Optional[float] = Field(default=None, description="Responses slower than this (s) count against the profile's health")
+    max_concurrency: int = Field(default=4, description="In-flight requests for this task on this profile")
+    queue_timeout: float = Field(default=30.0, description="Max wait for a free slot before trying the next profile (s)")
+    max_retries: int = Field(default=0, description="Client retries before falling back to the next profile")
+
+# Interactive chat gets its own pool and tight timeouts; background work never borrows its slots
+DEFAULT_ROUTES: Dict[str, List[ModelProfile]] = {
+    "chat": [ModelProfile(timeout=30.0, first_token_timeout=10.0, latency_slo=8.0, max_concurrency=16, queue_timeout=2.0, max_retries=1)],
+    "reflection": [ModelProfile(timeout=120.0, max_concurrency=2, max_retries=2)],
+    "summary": [ModelProfile(timeout=60.0, max_concurrency=2, max_retries=2)],
+    "consolidation": [ModelProfile(timeout=300.0, max_concurrency=1, max_retries=2)],
+}
+
+class ProfileHealth(BaseModel):
+    calls: int = 0
+    failures: int = 0
+    slo_misses: int = 0
+    consecutive_failures: int = 0
+    last_latency: Optional[float] = None
+    cooldown_until: float = 0.0
+
+class LLMRouter:
+    """
+    Maps task types to an ordered list of model profiles (primary first, then fallbacks).
+
+    Each (task, profile) pair has its own client, and so its own HTTP connection pool, and its
+    own concurrency slots, so background reflection or summaries never queue behind or in front
+    of interactive chat. A profile that errors or misses its latency SLO several times in a row
+    is skipped for a cooldown period and the next one is used.
+    """
+    FAILURE_THRESHOLD = 3
+    COOLDOWN = 60.0
+
+    def __init__(self, routes: Optional[Dict[str, List[ModelProfile]]] = None):
+        self.routes = {task: list(profiles) for task, profiles in DEFAULT_ROUTES.items()}
+        self.routes.update(routes or {})
+        self._clients: Dict[tuple, OpenAI] = {}
+        self._slots: Dict[tuple, threading.BoundedSemaphore] = {}
+        self._health: Dict[tuple, ProfileHealth] = {}
+        self._lock = threading.Lock()
+
+    def set_route(self, task: str, profiles: List[ModelProfile]):
+        with self._lock:
+            self.routes[task] = list(profiles)
+
+    def candidates(self, task: str) -> List[ModelProfile]:
+        """Profiles to try for `task`, healthy ones first. Never empty for a known task."""
+        if task not in self.routes:
+            raise ValueError(f"Unknown LLM task '{task}'. Known tasks: {', '.join(self.routes)}")
+        now = time.time()
+        with self._lock:
+            profiles = self.routes[task]
+            healthy = [p for p in profiles if self._health_of(task, p).cooldown_until <= now]
+            cooling = [p for p in profiles if p not in healthy]
+        return healthy + cooling
+
+    def _key(self, task: str, profile: ModelProfile) -> tuple:
+        return (task, profile.model, profile.base_url, profile.api_key, profile.timeout, profile.first_token_timeout, profile.max_retries)
+
+    def _health_of(self, task: str, profile: ModelProfile) -> ProfileHealth:
+        return self._health.setdefault(self._key(task, profile), ProfileHealth())
+
+    def client_for(self, task: str, profile: ModelProfile, base_url: str, api_key: str) -> OpenAI:
+        key = self._key(task, profile) + (base_url, api_key)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = OpenAI(
+                    base_url=profile.base_url or base_url,
+                    api_key=profile.api_key or api_key,
+                    timeout=profile.timeout,
+                    max_retries=profile.max_retries,
+                )
+                self._clients[key] = client
+            return client
+
+    def request_timeout(self, profile: ModelProfile, stream: bool) -> httpx.Timeout:
+        """
+        Per-request timeout. The first-token limit only applies to streams: a non-streamed
+        response sends nothing until it is complete, so it is bounded by `timeout` alone.
+        """
+        if stream and profile.first_token_timeout:
+            return httpx.Timeout(profile.timeout, read=profile.first_token_timeout)
+        return httpx.Timeout(profile.timeout)
+
+    def invalidate_clients(self):
+        """Drops cached clients (e.g. after an API key change)."""
+        with self._lock:
+            self._clients.clear()
+
+    @contextmanager
+    def slot(self, task: str, profile: ModelProfile):
+        """Holds one of the (task, profile) concurrency slots. Raises SlotTimeout if none frees up in time."""
+        key = self._key(task, profile)
+        with self._lock:
+            semaphore = self._slots.setdefault(key, threading.BoundedSemaphore(profile.max_concurrency))
+        if not semaphore.acquire(timeout=profile.queue_timeout):
+            raise SlotTimeout(f"No free slot for {task} on {profile.model or 'default model'}")
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+    def record(self, task: str, profile: ModelProfile, latency: Optional[float], ok: bool):
+        with self._lock:
+            health = self._health_of(task, profile)
+            health.calls += 1
+            health.last_latency = latency
+            missed_slo = ok and profile.latency_slo is not None and latency is not None and latency > profile.latency_slo
+            if not ok:
+                health.failures += 1
+            if missed_slo:
+                health.slo_misses += 1
+            if ok and not missed_slo:
+                health.consecutive_failures = 0
+            else:
+                health.consecutive_failures += 1
+                if health.consecutive_failures >= self.FAILURE_THRESHOLD:
+                    health.cooldown_until = time.time() + self.COOLDOWN
+                    health.consecutive_failures = 0
+
+    def stats(self) -> Dict[str, List[Dict]]:
+        with self._lock:
+            result = {}
+            for task, profiles in self.routes.items():
+                result[task] = [
+                    {"model": p.model or "(default)", **self._health_of(task, p).model_dump()} for p in profiles
+                ]
+            return result
@@ -1,77 +1,126 @@
-from openai import OpenAI
+import copy
 import os
+import time
 from typing import List, Dict, Optional
+from src.services.llm_router import LLMRouter, ModelProfile, SlotTimeout
+
+class LLMError(str):
+    """
+    Error message returned (or streamed) in place of a response. It is still shown as text,
+    but callers can tell it apart from generated tokens with isinstance.
+    """
+    pass
 
 class LLMService:
-    def __init__(self, api_key: Optional[str] = None, model: str = "x-ai/grok-4.1-fast:free"):
+    def __init__(self, api_key: Optional[str] = None, model: str = "x-ai/grok-4.1-fast:free", base_url: str = "https://openrouter.ai/api/v1",
+                 routes: Optional[Dict[str, List[ModelProfile]]] = None):
         self.api_key = api_key or os.getenv("OPENROUTER_API_KEY") or "dummy"
-        self.client = OpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=self.api_key,
-        )
+        self.base_url = base_url
         self.model = model
+        # Per-task model profiles (chat, reflection, summary, consolidation), see llm_router
+        self.router = LLMRouter(routes)
 
     def set_api_key(self, api_key: str):
         self.api_key = api_key
-        self.client = OpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=self.api_key,
-        )
+        self.router.invalidate_clients()
 
     def set_model(self, model: str):
         self.model = model
 
-    def generate_response(self, system_prompt: str, user_input: str, context: str = "") -> str:
-        if not self.api_key or self.api_key == "dummy":
-            return "Error: API Key not set."
+    def for_session(self, api_key: Optional[str] = None, model: Optional[str] = None) -> "LLMService":
+        """
+        A view of this service with its own API key / model, for one user session.
+        It shares the router (connection pools, concurrency slots and health), so the
+        shared service is never mutated by a session's settings.
+        """
+        session = copy.copy(self)
+        session.api_key = api_key or self.api_key
+        session.model = model or self.model
+        return session
 
+    def generate_response(self, system_prompt: str, user_input: str, context: str = "", task: str = "chat") -> str:
         messages = [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": f"Context:\n{context}\n\nUser: {user_input}"}
         ]
+        return self.generate_chat(messages, task=task)
 
-        try:
-            completion = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-            )
-            return completion.choices[0].message.content
-        except Exception as e:
-            return f"Error calling LLM: {str(e)}"
-
-    def generate_response_stream(self, system_prompt: str, user_input: str, context: str = ""):
+    def generate_chat(self, messages: List[Dict], task: str = "chat") -> str:
         if not self.api_key or self.api_key == "dummy":
-            yield "Error: API Key not set."
-            return
+            return LLMError("Error: API Key not set.")
 
+        # Try the task's profiles in order until one answers
+        error = None
+        for profile in self.router.candidates(task):
+            try:
+                with self.router.slot(task, profile):
+                    start = time.time()
+                    completion = self.router.client_for(task, profile, self.base_url, self.api_key).chat.completions.create(
+                        model=profile.model or self.model,
+                        messages=messages,
+                        timeout=self.router.request_timeout(profile, stream=False),
+                    )
+                self.router.record(task, profile, time.time() - start, ok=True)
+                return completion.choices[0].message.content
+            except SlotTimeout as e:
+                # Busy, not failing: try the next profile without hurting this one's health
+                error = e
+            except Exception as e:
+                self.router.record(task, profile, None, ok=False)
+                error = e
+        return LLMError(f"Error calling LLM: {str(error)}")
+
+    def generate_response_stream(self, system_prompt: str, user_input: str, context: str = "", task: str = "chat"):
         messages = [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": f"Context:\n{context}\n\nUser: {user_input}"}
         ]
+        yield from self.generate_chat_stream(messages, task=task)
+
+    def generate_chat_stream(self, messages: List[Dict], task: str = "chat"):
+        if not self.api_key or self.api_key == "dummy":
+            yield LLMError("Error: API Key not set.")
+            return
 
-        try:
-            stream = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                stream=True,
-            )
-            for chunk in stream:
-                if chunk.choices[0].delta.content is not None:
-                    yield chunk.choices[0].delta.content
-        except Exception as e:
-            yield f"Error calling LLM: {str(e)}"
+        error = None
+        for profile in self.router.candidates(task):
+            first_token = None
+            try:
+                with self.router.slot(task, profile):
+                    start = time.time()
+                    stream = self.router.client_for(task, profile, self.base_url, self.api_key).chat.completions.create(
+                        model=profile.model or self.model,
+                        messages=messages,
+                        stream=True,
+                        timeout=self.router.request_timeout(profile, stream=True),
+                    )
+                    for chunk in stream:
+                        if chunk.choices and chunk.choices[0].delta.content is not None:
+                            if first_token is None:
+                                first_token = time.time()
+                            yield chunk.choices[0].delta.content
+                # Streams are judged on time to first token
+                self.router.record(task, profile, (first_token or time.time()) - start, ok=True)
+                return
+            except SlotTimeout as e:
+                # Busy, not failing: try the next profile without hurting this one's health
+                error = e
+            except Exception as e:
+                self.router.record(task, profile, None, ok=False)
+                if first_token is not None:
+                    # Tokens were already shown, a fallback would repeat the answer
+                    yield LLMError(f" Error calling LLM: {str(e)}")
+                    return
+                error = e
+        yield LLMError(f"Error calling LLM: {str(error)}")
 
-    def generate_summary(self, memories: str) -> str:
+    def generate_summary(self, memories: str, task: str = "summary") -> str:
         if not self.api_key:
-            return "Error: API Key not set."
+            return LLMError("Error: API Key not set.")
             
         prompt = f"Summarize the following events into a concise memory update:\n{memories}"
         
-        try:
-            completion = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
-            )
-            return completion.choices[0].message.content
-        except Exception as e:
-            return f"Error summarizing: {str(e)}"
+        response = self.generate_chat([{"role": "user", "content": prompt}], task=task)
+        if response.startswith("Error calling LLM: "):
+            return LLMError("Error summarizing: " + response[len("Error calling LLM: "):])
+        return response
@@ -0,0 +1,250 @@
+import json
+import mmap
+import os
+import struct
+from datetime import datetime
+from collections.abc import MutableSequence
+from typing import Any, Callable, Dict, List, Optional
+from src.models.schema import CharacterProfile, DailyLogEntry
+from src.storage.json_store import JSONStore
+from src.storage.file_lock import atomic_write
+
+# Layout (little endian):
+#   header    : magic "CMPB", u16 format version, u32 core length
+#   core      : compact JSON of the profile without daily_log / relationship histories
+#   directory : u32 segment count, then per segment: u32 name length, name, u32 record count, u64 segment offset
+#   segments  : (count + 1) u64 record offsets relative to the first record, then the records
+# A record is the compact JSON of one daily log entry or one relationship history line.
+MAGIC = b"CMPB"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<4sHI")
+_U32 = struct.Struct("<I")
+_U64 = struct.Struct("<Q")
+
+DAILY_LOG_SEGMENT = "daily_log"
+HISTORY_SEGMENT_PREFIX = "history:"
+
+# Kept out of the core record and stored as segments instead
+_SEGMENT_FIELDS = {"daily_log": True, "relationships": {"__all__": {"history"}}}
+
+class LazyRecordList(MutableSequence):
+    """
+    List-like view over an array-backed segment of a binary profile.
+    Records are decoded on access and cached; appends stay in memory until the next save.
+    Any other mutation materializes the whole segment into a plain list.
+    """
+    def __init__(self, buffer, offset: int, count: int, decode: Callable[[bytes], Any]):
+        self._buffer = buffer
+        self._offset = offset
+        self._count = count
+        self._decode = decode
+        self._cache: Dict[int, Any] = {}
+        self._tail: List[Any] = []
+        self._items: Optional[List[Any]] = None
+
+    def _raw(self, index: int) -> bytes:
+        start, end = struct.unpack_from("<QQ", self._buffer, self._offset + 8 * index)
+        base = self._offset + 8 * (self._count + 1)
+        return self._buffer[base + start:base + end]
+
+    def _get(self, index: int) -> Any:
+        if index >= self._count:
+            return self._tail[index - self._count]
+        if index not in self._cache:
+            self._cache[index] = self._decode(self._raw(index))
+        return self._cache[index]
+
+    def _materialize(self) -> List[Any]:
+        if self._items is None:
+            self._items = [self._get(i) for i in range(len(self))]
+            self._buffer = None
+            self._cache = {}
+            self._tail = []
+        return self._items
+
+    def __len__(self) -> int:
+        if self._items is not None:
+            return len(self._items)
+        return self._count + len(self._tail)
+
+    def __getitem__(self, index):
+        if self._items is not None:
+            return self._items[index]
+        if isinstance(index, slice):
+            return [self._get(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("list index out of range")
+        return self._get(index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __setitem__(self, index, value):
+        self._materialize()[index] = value
+
+    def __delitem__(self, index):
+        del self._materialize()[index]
+
+    def insert(self, index: int, value: Any):
+        self._materialize().insert(index, value)
+
+    def append(self, value: Any):
+        if self._items is not None:
+            self._items.append(value)
+        else:
+            self._tail.append(value)
+
+    def __copy__(self) -> "LazyRecordList":
+        # The mapped file is read-only, so copies can share it
+        clone = LazyRecordList(self._buffer, self._offset, self._count, self._decode)
+        clone._cache = dict(self._cache)
+        clone._tail = list(self._tail)
+        clone._items = list(self._items) if self._items is not None else None
+        return clone
+
+    def __eq__(self, other) -> bool:
+        return list(self) == list(other)
+
+    def __repr__(self) -> str:
+        return f"LazyRecordList(len={len(self)})"
+
+    def iter_encoded(self, encode: Callable[[Any], bytes]):
+        """Yields encoded records, copying untouched ones straight from the file."""
+        if self._items is not None:
+            for item in self._items:
+                yield encode(item)
+            return
+        for i in range(self._count):
+            yield encode(self._cache[i]) if i in self._cache else self._raw(i)
+        for item in self._tail:
+            yield encode(item)
+
+def _encode_log_entry(entry: DailyLogEntry) -> bytes:
+    return entry.model_dump_json().encode("utf-8")
+
+def _decode_log_entry(raw: bytes) -> DailyLogEntry:
+    return DailyLogEntry.model_validate_json(raw)
+
+def _encode_history(line: str) -> bytes:
+    return json.dumps(line, ensure_ascii=False).encode("utf-8")
+
+def _decode_history(raw: bytes) -> str:
+    return json.loads(raw)
+
+def _encode_records(values, encode: Callable[[Any], bytes]):
+    if isinstance(values, LazyRecordList):
+        return list(values.iter_encoded(encode))
+    return [encode(v) for v in values]
+
+class BinaryProfileStore(JSONStore):
+    """
+    Compact profile storage. Loading only parses the small core record; daily_log and
+    relationship histories are mmap'd segments decoded on access, so load time and
+    memory do not grow with log length.
+    """
+
+    def _ensure_file(self):
+        if not os.path.exists(self.file_path):
+            with self.lock():
+                if not os.path.exists(self.file_path):
+                    # An empty file means no profile has been saved yet
+                    atomic_write(self.file_path, b"")
+
+    def _encode(self, profile: CharacterProfile) -> bytes:
+        core = json.dumps(
+            profile.model_dump(mode="json", exclude=_SEGMENT_FIELDS),
+            ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8")
+
+        segments = [(DAILY_LOG_SEGMENT, _encode_records(profile.daily_log, _encode_log_entry))]
+        for name, rel in profile.relationships.items():
+            segments.append((HISTORY_SEGMENT_PREFIX + name, _encode_records(rel.history, _encode_history)))
+
+        # 1. Header, core and segment directory
+        directory_size = _U32.size + sum(
+            _U32.size + len(name.encode("utf-8")) + _U32.size + _U64.size for name, _ in segments
+        )
+        position = _HEADER.size + len(core) + directory_size
+        out = [_HEADER.pack(MAGIC, FORMAT_VERSION, len(core)), core, _U32.pack(len(segments))]
+        for name, records in segments:
+            encoded_name = name.encode("utf-8")
+            out += [_U32.pack(len(encoded_name)), encoded_name, _U32.pack(len(records)), _U64.pack(position)]
+            position += _U64.size * (len(records) + 1) + sum(len(r) for r in records)
+
+        # 2. Segments: offset array followed by the records
+        for _, records in segments:
+            offset = 0
+            offsets = [_U64.pack(0)]
+            for r in records:
+                offset += len(r)
+                offsets.append(_U64.pack(offset))
+            out += offsets
+            out += records
+        return b"".join(out)
+
+    def _read(self):
+        """Maps the file and returns (buffer, core dict, {segment name: (offset, count)})."""
+        with open(self.file_path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None, {}, {}
+            if os.name == "nt":
+                # Windows cannot replace a file while a view of it is mapped, and loaded
+                # profiles keep their buffer; read it instead (records are still decoded lazily)
+                buffer = f.read()
+            else:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, core_len = _HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{self.file_path} is not a binary profile (format {FORMAT_VERSION}).")
+        position = _HEADER.size
+        core = json.loads(buffer[position:position + core_len])
+        position += core_len
+
+        segments = {}
+        (n_segments,) = _U32.unpack_from(buffer, position)
+        position += _U32.size
+        for _ in range(n_segments):
+            (name_len,) = _U32.unpack_from(buffer, position)
+            position += _U32.size
+            name = buffer[position:position + name_len].decode("utf-8")
+            position += name_len
+            (count,) = _U32.unpack_from(buffer, position)
+            (offset,) = _U64.unpack_from(buffer, position + _U32.size)
+            position += _U32.size + _U64.size
+            segments[name] = (offset, count)
+        return buffer, core, segments
+
+    def get_version(self) -> Optional[datetime]:
+        _, core, _ = self._read()
+        version = core.get("updated_at")
+        return datetime.fromisoformat(version) if version else None
+
+    def load_model(self) -> Optional[CharacterProfile]:
+        buffer, core, segments = self._read()
+        if not core:
+            return None
+
+        profile = CharacterProfile(**core)
+        offset, count = segments.get(DAILY_LOG_SEGMENT, (0, 0))
+        profile.daily_log = LazyRecordList(buffer, offset, count, _decode_log_entry)
+        for name, rel in profile.relationships.items():
+            offset, count = segments.get(HISTORY_SEGMENT_PREFIX + name, (0, 0))
+            rel.history = LazyRecordList(buffer, offset, count, _decode_history)
+        return profile
+
+    def load_profile(self) -> Dict[str, Any]:
+        # Fully materialized; prefer load_model() on hot paths
+        profile = self.load_model()
+        return profile.model_dump(mode="json") if profile else {}
+
+def convert_json_profile(json_path: str, binary_path: str) -> CharacterProfile:
+    """Converts an existing profile.json into the binary format."""
+    profile = JSONStore(json_path).load_model()
+    if profile is None:
+        raise ValueError(f"{json_path} does not contain a profile.")
+    BinaryProfileStore(binary_path).save_profile(profile)
+    return profile
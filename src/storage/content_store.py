@@ -0,0 +1,41 @@
+import hashlib
+import sqlite3
+import threading
+from typing import Dict, List
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+class ContentStore:
+    """
+    Content-addressed blob store for full memory content, keyed by SHA-256.
+    Lets the vector collection hold only the index text and small metadata.
+    """
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS contents (hash TEXT PRIMARY KEY, content TEXT NOT NULL) WITHOUT ROWID")
+
+    def put_many(self, contents: List[str]) -> List[str]:
+        hashes = [content_hash(c) for c in contents]
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO contents (hash, content) VALUES (?, ?)", list(zip(hashes, contents))
+            )
+        return hashes
+
+    def get_many(self, hashes: List[str]) -> Dict[str, str]:
+        unique = list(set(h for h in hashes if h))
+        found: Dict[str, str] = {}
+        with self._lock:
+            # Stay below SQLite's bound parameter limit
+            for i in range(0, len(unique), 500):
+                chunk = unique[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.conn.execute(
+                    f"SELECT hash, content FROM contents WHERE hash IN ({placeholders})", chunk
+                ).fetchall()
+                found.update(rows)
+        return found
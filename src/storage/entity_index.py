@@ -0,0 +1,88 @@
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+def normalize_entity(name: str) -> str:
+    return name.strip().casefold()
+
+class EntityIndex:
+    """
+    Inverted index from entity (person, place...) to memory ids, kept next to the
+    vector store and updated incrementally as memories are added or deleted.
+    Each row carries the memory's timestamp and importance so that "latest memories
+    about X" is answered by SQLite alone.
+    """
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS entity_memories ("
+                "entity TEXT NOT NULL, memory_id TEXT NOT NULL, "
+                "PRIMARY KEY (entity, memory_id)) WITHOUT ROWID"
+            )
+            # Indexes created before these columns existed get them added (NULL until backfilled)
+            columns = [row[1] for row in self.conn.execute("PRAGMA table_info(entity_memories)")]
+            if "timestamp" not in columns:
+                self.conn.execute("ALTER TABLE entity_memories ADD COLUMN timestamp TEXT")
+            if "importance" not in columns:
+                self.conn.execute("ALTER TABLE entity_memories ADD COLUMN importance INTEGER")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_entity_memories_memory ON entity_memories (memory_id)")
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_entity_memories_recent ON entity_memories (entity, timestamp DESC)"
+            )
+
+    def add(self, entries: Iterable[Tuple[str, str, Optional[str], Optional[int]]]):
+        """Adds (memory_id, entity, timestamp, importance) entries."""
+        rows = [
+            (normalize_entity(entity), memory_id, timestamp, importance)
+            for memory_id, entity, timestamp, importance in entries if entity.strip()
+        ]
+        if not rows:
+            return
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO entity_memories (entity, memory_id, timestamp, importance) VALUES (?, ?, ?, ?)", rows
+            )
+
+    def set_order(self, entries: Iterable[Tuple[str, Optional[str], Optional[int]]]):
+        """Updates (memory_id, timestamp, importance) of already indexed memories."""
+        rows = [(timestamp, importance, memory_id) for memory_id, timestamp, importance in entries]
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "UPDATE entity_memories SET timestamp = COALESCE(?, timestamp), importance = COALESCE(?, importance) "
+                "WHERE memory_id = ?", rows
+            )
+
+    def remove(self, memory_ids: List[str]):
+        with self._lock, self.conn:
+            self.conn.executemany("DELETE FROM entity_memories WHERE memory_id = ?", [(i,) for i in memory_ids])
+
+    def clear(self):
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM entity_memories")
+
+    def get_memory_ids(self, entity: str, limit: Optional[int] = None) -> List[str]:
+        """The entity's memory ids, most recent first."""
+        query = "SELECT memory_id FROM entity_memories WHERE entity = ? ORDER BY timestamp DESC, importance DESC"
+        params: tuple = (normalize_entity(entity),)
+        if limit:
+            query += " LIMIT ?"
+            params += (limit,)
+        with self._lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return [r[0] for r in rows]
+
+    def unordered_ids(self, limit: int = 1000) -> List[str]:
+        """Memory ids indexed before timestamps were stored."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT DISTINCT memory_id FROM entity_memories WHERE timestamp IS NULL LIMIT ?", (limit,)
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self.conn.execute("SELECT entity, COUNT(*) FROM entity_memories GROUP BY entity").fetchall()
+        return dict(rows)
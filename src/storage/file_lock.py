@@ -0,0 +1,50 @@
+import os
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+@contextmanager
+def file_lock(lock_path: str, exclusive: bool = True):
+    """
+    Advisory inter-process lock backed by a sidecar lock file.
+    Shared locks are only available on POSIX; on Windows every lock is exclusive.
+    """
+    with open(lock_path, "a+b") as f:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK gives up after ~10 seconds, keep waiting
+                    time.sleep(0.05)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def atomic_write(file_path: str, data: bytes):
+    """Writes to a temp file in the same directory, fsyncs it and renames it over the target."""
+    directory = os.path.dirname(os.path.abspath(file_path))
+    tmp_path = os.path.join(directory, f".{os.path.basename(file_path)}.{os.getpid()}.{time.time_ns()}.tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -1,25 +1,72 @@
 import json
 import os
-from typing import Dict, Any
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional
 from src.models.schema import CharacterProfile
+from src.storage.file_lock import file_lock, atomic_write
+
+class ProfileConflictError(Exception):
+    """Raised when the profile on disk was saved by someone else since it was loaded."""
+    pass
+
+class ProfileCorruptError(ValueError):
+    """Raised when the stored profile cannot be parsed. It is left untouched for inspection."""
+    pass
 
 class JSONStore:
     def __init__(self, file_path: str):
         self.file_path = file_path
+        self.lock_path = file_path + ".lock"
         self._ensure_file()
 
     def _ensure_file(self):
         if not os.path.exists(self.file_path):
-            with open(self.file_path, 'w', encoding='utf-8') as f:
-                json.dump({}, f)
+            with self.lock():
+                if not os.path.exists(self.file_path):
+                    atomic_write(self.file_path, b"{}")
+
+    def lock(self, exclusive: bool = True):
+        # Per-character advisory lock, held only by writers
+        return file_lock(self.lock_path, exclusive=exclusive)
+
+    def save_profile(self, profile: CharacterProfile, expected_version: Optional[datetime] = None, check_version: bool = False) -> datetime:
+        """
+        Atomically replaces the profile on disk and returns its new version (`updated_at`).
+        With `check_version`, raises ProfileConflictError instead of overwriting when the
+        stored version is not `expected_version` (None meaning no profile was stored yet).
+        """
+        with self.lock():
+            current = self.get_version()
+            if check_version and current != expected_version:
+                raise ProfileConflictError(
+                    f"Profile {self.file_path} changed on disk (expected {expected_version}, found {current})."
+                )
+
+            # Versions must strictly increase, even if the clock did not move
+            now = datetime.now()
+            if current is not None and now <= current:
+                now = current + timedelta(microseconds=1)
+            profile.updated_at = now
+
+            atomic_write(self.file_path, self._encode(profile))
+            return profile.updated_at
+
+    def _encode(self, profile: CharacterProfile) -> bytes:
+        return profile.model_dump_json(indent=2).encode("utf-8")
+
+    def get_version(self) -> Optional[datetime]:
+        version = self.load_profile().get("updated_at")
+        return datetime.fromisoformat(version) if version else None
 
-    def save_profile(self, profile: CharacterProfile):
-        with open(self.file_path, 'w', encoding='utf-8') as f:
-            f.write(profile.model_dump_json(indent=2))
+    def load_model(self) -> Optional[CharacterProfile]:
+        data = self.load_profile()
+        return CharacterProfile(**data) if data else None
 
     def load_profile(self) -> Dict[str, Any]:
+        # Writes are atomic renames, so readers never see a partial file and need no lock
         with open(self.file_path, 'r', encoding='utf-8') as f:
             try:
                 return json.load(f)
-            except json.JSONDecodeError:
-                return {}
+            except json.JSONDecodeError as e:
+                # Never read as "no profile yet": the next save would overwrite it
+                raise ProfileCorruptError(f"Profile {self.file_path} is corrupt ({e}); fix or move it away.") from e
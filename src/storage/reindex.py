@@ -0,0 +1,183 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Optional, Set
+from pydantic import BaseModel, Field
+from src.storage.file_lock import atomic_write
+
+DEFAULT_COLLECTION = "memory_stream"
+
+class ReindexState(BaseModel):
+    active_collection: str = Field(default=DEFAULT_COLLECTION, description="Collection reads are served from")
+    target_collection: Optional[str] = Field(default=None, description="Shadow collection being filled, if a re-index is in progress")
+    target_embedding_function: str = Field(default="", description="Identity of the shadow's embedder, see embedding_function_key")
+    previous_collection: Optional[str] = Field(default=None, description="Collection replaced by the last cutover, kept until dropped")
+    status: str = Field(default="idle", description="idle, running, paused, verifying, complete or failed")
+    # Source records copied so far; a resumed job continues from here
+    offset: int = 0
+    copied: int = 0
+    started_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    error: str = ""
+
+def load_reindex_state(path: str) -> ReindexState:
+    if not os.path.exists(path):
+        return ReindexState()
+    with open(path, "r", encoding="utf-8") as f:
+        return ReindexState.model_validate_json(f.read())
+
+def save_reindex_state(path: str, state: ReindexState):
+    state.updated_at = datetime.now()
+    atomic_write(path, state.model_dump_json(indent=2).encode("utf-8"))
+
+def embedding_function_name(embedding_function) -> str:
+    name = getattr(embedding_function, "name", None)
+    return name() if callable(name) else type(embedding_function).__name__
+
+def embedding_function_key(embedding_function) -> str:
+    """
+    Name plus configuration of an embedder, e.g. the sentence-transformers model: two embedders
+    with the same key produce the same vectors. `name()` alone is shared by every model of a family.
+    """
+    try:
+        config = embedding_function.get_config()
+    except Exception:
+        config = None
+    return f"{embedding_function_name(embedding_function)}:{json.dumps(config, sort_keys=True, default=str)}"
+
+class Reindexer:
+    """
+    Online re-index of a VectorStore into a shadow collection built with a new embedding function.
+
+    1. The shadow is created and the store starts writing to both collections.
+    2. Every memory is streamed from the active collection in parallel batches, embedded with the
+       new model and copied over; progress is saved after each round, so an interrupted job resumes.
+    3. Missing / extra records are reconciled, then reads are switched to the shadow under the
+       store's write lock, once both collections hold exactly the same ids.
+    Reads keep being served from the active collection the whole time.
+    """
+    def __init__(self, vector_store, embedding_function, batch_size: int = 256, workers: int = 2,
+                 throttle: float = 0.0, keep_old: bool = True):
+        self.vector_store = vector_store
+        self.embedding_function = embedding_function
+        self.batch_size = batch_size
+        self.workers = workers
+        # Seconds to pause between rounds, to leave room for the live workload
+        self.throttle = throttle
+        # Other processes only see the cutover on restart and keep writing to the old collection
+        self.keep_old = keep_old
+        self._cancelled = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def state(self) -> ReindexState:
+        return self.vector_store.reindex_state
+
+    def run_in_background(self) -> threading.Thread:
+        self.thread = threading.Thread(target=self.run, name="reindex", daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def cancel(self):
+        """Stops after the current round. The job can be resumed later."""
+        self._cancelled.set()
+
+    def run(self) -> ReindexState:
+        vs = self.vector_store
+        try:
+            # 1. Shadow collection (or the one of an interrupted job with the same embedder)
+            vs.begin_shadow(self.embedding_function)
+
+            # 2. Bulk copy
+            self._copy_all()
+            if self._cancelled.is_set():
+                vs.set_reindex_status("paused")
+                return self.state
+
+            # 3. Reconcile writes that raced the copy, then switch reads over
+            vs.set_reindex_status("verifying")
+            for _ in range(3):
+                missing, extra = self._diff()
+                if not missing and not extra:
+                    break
+                self._reconcile(missing, extra)
+
+            with vs.lock:
+                missing, extra = self._diff()
+                self._reconcile(missing, extra)
+                vs.cutover(keep_old=self.keep_old)
+        except Exception as e:
+            # Stop dual writes too, a broken shadow must not fail live writes
+            vs.fail_reindex(str(e))
+            raise
+        return self.state
+
+    def _copy_all(self):
+        vs = self.vector_store
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="reindex-batch") as executor:
+            while not self._cancelled.is_set():
+                offsets = [self.state.offset + i * self.batch_size for i in range(self.workers)]
+                pages = [vs.collection.get(limit=self.batch_size, offset=o, include=[])['ids'] for o in offsets]
+                pages = [p for p in pages if p]
+                if not pages:
+                    break
+
+                copied = sum(executor.map(self._copy_batch, pages))
+                vs.advance_reindex(sum(len(p) for p in pages), copied)
+                if self.throttle:
+                    time.sleep(self.throttle)
+
+    def _copy_batch(self, ids: List[str]) -> int:
+        vs = self.vector_store
+        # 1. Embed outside the lock, so live writes are not held up by the model
+        got = vs.collection.get(ids=ids, include=["documents"])
+        documents = dict(zip(got['ids'], got['documents']))
+        if not documents:
+            return 0
+        embeddings = dict(zip(documents, self.embedding_function(list(documents.values()))))
+
+        # 2. Copy what did not change meanwhile; changed records reach the shadow through dual writes
+        with vs.lock:
+            fresh = vs.collection.get(ids=list(documents), include=["documents", "metadatas"])
+            keep = [i for i, (id, document) in enumerate(zip(fresh['ids'], fresh['documents'])) if documents.get(id) == document]
+            if keep:
+                self._shadow().upsert(
+                    ids=[fresh['ids'][i] for i in keep],
+                    documents=[fresh['documents'][i] for i in keep],
+                    metadatas=[fresh['metadatas'][i] for i in keep],
+                    embeddings=[embeddings[fresh['ids'][i]] for i in keep]
+                )
+        return len(keep)
+
+    def _shadow(self):
+        # Dropped when a live write to it failed
+        if self.vector_store.shadow is None:
+            raise RuntimeError(self.state.error or "The shadow collection was dropped.")
+        return self.vector_store.shadow
+
+    def _ids(self, collection) -> Set[str]:
+        ids: Set[str] = set()
+        offset = 0
+        while True:
+            page = collection.get(limit=5000, offset=offset, include=[])['ids']
+            if not page:
+                return ids
+            ids.update(page)
+            offset += len(page)
+
+    def _diff(self):
+        source = self._ids(self.vector_store.collection)
+        target = self._ids(self._shadow())
+        return sorted(source - target), sorted(target - source)
+
+    def _reconcile(self, missing: List[str], extra: List[str]):
+        vs = self.vector_store
+        for i in range(0, len(missing), self.batch_size):
+            copied = self._copy_batch(missing[i:i + self.batch_size])
+            vs.advance_reindex(0, copied)
+        if extra:
+            with vs.lock:
+                self._shadow().delete(ids=extra)
@@ -0,0 +1,229 @@
+import base64
+import hashlib
+import json
+import os
+import uuid
+import zlib
+from array import array
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, Field
+from src.models.schema import CharacterProfile
+from src.storage.file_lock import atomic_write
+from src.storage.reindex import embedding_function_key
+
+# Daily log entries per profile chunk. The log is append-only, so full chunks
+# keep their hash and are shared by every later snapshot.
+LOG_CHUNK_SIZE = 256
+# Memory records per chunk written by one snapshot
+RECORD_CHUNK_SIZE = 1000
+
+class Snapshot(BaseModel):
+    id: str = Field(default_factory=lambda: datetime.now().strftime("%Y%m%d%H%M%S") + "-" + uuid.uuid4().hex[:8])
+    character_id: str
+    parent_id: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.now)
+    embedding_function: str = Field(default="", description="Embedder the stored embeddings come from, see embedding_function_key")
+    profile_chunk: str = Field(default="", description="Profile without daily_log")
+    log_chunks: List[str] = Field(default=[])
+    # memory id -> [record hash, chunk hash]
+    memories: Dict[str, List[str]] = Field(default_factory=dict)
+    new_records: int = 0
+
+def _hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def _canonical(value: Any) -> bytes:
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+def _encode_embedding(embedding) -> str:
+    return base64.b64encode(array("f", [float(x) for x in embedding]).tobytes()).decode("ascii")
+
+def _decode_embedding(data: str) -> List[float]:
+    values = array("f")
+    values.frombytes(base64.b64decode(data))
+    return values.tolist()
+
+class SnapshotStore:
+    """
+    Incremental, content-addressed snapshots of a character (profile + memory collection).
+
+    Layout under `root`:
+      chunks/<aa>/<hash>                      zlib-compressed JSON, shared across snapshots and characters
+      manifests/<character_id>/<snapshot>.json
+    A snapshot only writes the memories added or changed since its parent; everything
+    else is referenced from the chunks earlier snapshots already wrote.
+    """
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(os.path.join(root, "chunks"), exist_ok=True)
+        os.makedirs(os.path.join(root, "manifests"), exist_ok=True)
+
+    # --- Chunks ---
+    def _chunk_path(self, chunk_hash: str) -> str:
+        return os.path.join(self.root, "chunks", chunk_hash[:2], chunk_hash)
+
+    def _put_chunk(self, value: Any) -> str:
+        data = _canonical(value)
+        chunk_hash = _hash(data)
+        path = self._chunk_path(chunk_hash)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            atomic_write(path, zlib.compress(data))
+        return chunk_hash
+
+    def _get_chunk(self, chunk_hash: str) -> Any:
+        with open(self._chunk_path(chunk_hash), "rb") as f:
+            return json.loads(zlib.decompress(f.read()))
+
+    # --- Manifests ---
+    def _manifest_dir(self, character_id: str) -> str:
+        return os.path.join(self.root, "manifests", character_id)
+
+    def _save_manifest(self, snapshot: Snapshot):
+        os.makedirs(self._manifest_dir(snapshot.character_id), exist_ok=True)
+        path = os.path.join(self._manifest_dir(snapshot.character_id), f"{snapshot.id}.json")
+        atomic_write(path, snapshot.model_dump_json().encode("utf-8"))
+
+    def list_snapshots(self, character_id: str) -> List[Snapshot]:
+        directory = self._manifest_dir(character_id)
+        if not os.path.isdir(directory):
+            return []
+        snapshots = []
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".json"):
+                with open(os.path.join(directory, name), "r", encoding="utf-8") as f:
+                    snapshots.append(Snapshot.model_validate_json(f.read()))
+        return sorted(snapshots, key=lambda s: s.created_at)
+
+    def get_snapshot(self, character_id: str, snapshot_id: Optional[str] = None) -> Optional[Snapshot]:
+        """The given snapshot, or the latest one."""
+        snapshots = self.list_snapshots(character_id)
+        if snapshot_id is None:
+            return snapshots[-1] if snapshots else None
+        return next((s for s in snapshots if s.id == snapshot_id), None)
+
+    # --- Snapshot ---
+    def create(self, character_id: str, memory_manager, batch_size: int = 1000) -> Snapshot:
+        """
+        Captures the profile and memory collection at one consistent point: profile saves
+        (in-process and cross-process) and memory writes are held off meanwhile.
+        """
+        mm = memory_manager
+        vs = mm.vector_store
+        parent = self.get_snapshot(character_id)
+        embedder = embedding_function_key(vs.embedding_function)
+        # Embeddings are only comparable if the embedding model (name and config) did not change
+        previous = parent.memories if parent and parent.embedding_function == embedder else {}
+
+        snapshot = Snapshot(character_id=character_id, parent_id=parent.id if parent else None, embedding_function=embedder)
+
+        with mm.lock, mm.profile_store.lock(), vs.lock:
+            # 1. Profile: core, then the daily log in fixed-size chunks
+            profile = mm.profile_store.load_profile()
+            if not profile:
+                # Never saved yet: the in-memory (default) profile is the character's state
+                profile = mm.profile.model_dump(mode="json")
+            daily_log = profile.pop("daily_log", [])
+            snapshot.profile_chunk = self._put_chunk(profile)
+            snapshot.log_chunks = [
+                self._put_chunk(daily_log[i:i + LOG_CHUNK_SIZE]) for i in range(0, len(daily_log), LOG_CHUNK_SIZE)
+            ]
+
+            # 2. Memories: hash every record, keep the unchanged ones from the parent
+            changed = []
+            offset = 0
+            while True:
+                batch = vs.collection.get(limit=batch_size, offset=offset, include=["documents", "metadatas"])
+                if not batch['ids']:
+                    break
+                for id, document, meta in zip(batch['ids'], batch['documents'], batch['metadatas']):
+                    record_hash = _hash(_canonical({"id": id, "document": document, "metadata": meta}))
+                    if id in previous and previous[id][0] == record_hash:
+                        snapshot.memories[id] = previous[id]
+                    else:
+                        changed.append((id, record_hash))
+                offset += batch_size
+
+            # 3. Write only new / changed records, with their embeddings and full content
+            for i in range(0, len(changed), RECORD_CHUNK_SIZE):
+                part = changed[i:i + RECORD_CHUNK_SIZE]
+                got = vs.collection.get(ids=[id for id, _ in part], include=["documents", "metadatas", "embeddings"])
+                contents = vs.content_store.get_many([m.get("content_hash") for m in got['metadatas']])
+                records = []
+                for id, document, meta, embedding in zip(got['ids'], got['documents'], got['metadatas'], got['embeddings']):
+                    records.append({
+                        "id": id,
+                        "document": document,
+                        "metadata": meta,
+                        "content": contents.get(meta.get("content_hash")),
+                        "embedding": _encode_embedding(embedding)
+                    })
+                chunk_hash = self._put_chunk(records)
+                for id, record_hash in part:
+                    snapshot.memories[id] = [record_hash, chunk_hash]
+            snapshot.new_records = len(changed)
+
+        self._save_manifest(snapshot)
+        return snapshot
+
+    # --- Restore ---
+    def restore(self, character_id: str, snapshot_id: Optional[str], memory_manager) -> Snapshot:
+        """
+        Replaces the state of `memory_manager`'s character (profile and memories) with a snapshot.
+        Use a fresh MemoryManager on new paths to clone a character instead.
+        Stored embeddings are reused when they come from the store's current embedder; otherwise
+        (e.g. after a re-index to another model) the documents are re-embedded.
+        """
+        snapshot = self.get_snapshot(character_id, snapshot_id)
+        if snapshot is None:
+            raise ValueError(f"No snapshot {snapshot_id or '(latest)'} for character {character_id}.")
+
+        mm = memory_manager
+        vs = mm.vector_store
+
+        profile_data = self._get_chunk(snapshot.profile_chunk)
+        profile_data["daily_log"] = [entry for chunk in snapshot.log_chunks for entry in self._get_chunk(chunk)]
+        profile = CharacterProfile(**profile_data)
+
+        with mm.lock, vs.lock:
+            # 1. Decide before anything is dropped: vectors of another model cannot go in this collection
+            reuse_embeddings = snapshot.embedding_function == embedding_function_key(vs.embedding_function)
+
+            # 2. Memories, straight from the stored embeddings when possible
+            vs.reset()
+            by_chunk: Dict[str, set] = {}
+            for id, (_, chunk_hash) in snapshot.memories.items():
+                by_chunk.setdefault(chunk_hash, set()).add(id)
+            for chunk_hash, ids in by_chunk.items():
+                records = [r for r in self._get_chunk(chunk_hash) if r["id"] in ids]
+                contents = [r["content"] for r in records if r["content"] is not None]
+                if contents:
+                    vs.content_store.put_many(contents)
+                for i in range(0, len(records), RECORD_CHUNK_SIZE):
+                    part = records[i:i + RECORD_CHUNK_SIZE]
+                    vs.add_records(
+                        ids=[r["id"] for r in part],
+                        documents=[r["document"] for r in part],
+                        metadatas=[r["metadata"] for r in part],
+                        embeddings=[_decode_embedding(r["embedding"]) for r in part] if reuse_embeddings else None
+                    )
+
+            # 3. Profile
+            mm.replace_profile(profile)
+
+        return snapshot
+
+    def clone(self, character_id: str, snapshot_id: Optional[str], new_character_id: str, memory_manager) -> Snapshot:
+        """Restores a snapshot into another character and records it as that character's first snapshot."""
+        snapshot = self.restore(character_id, snapshot_id, memory_manager)
+        # Same chunks, new owner: nothing is copied
+        cloned = snapshot.model_copy(update={
+            "id": Snapshot(character_id=new_character_id).id,
+            "character_id": new_character_id,
+            "parent_id": None,
+            "created_at": datetime.now(),
+            "new_records": 0
+        })
+        self._save_manifest(cloned)
+        return cloned
@@ -1,65 +1,506 @@
 import chromadb
 from chromadb.config import Settings
-from typing import List, Dict
+from chromadb.utils import embedding_functions
+from typing import List, Dict, Optional
+import os
+import threading
 import uuid
+from collections import OrderedDict
 from datetime import datetime
 from src.models.schema import MemoryItem
+from src.storage.entity_index import EntityIndex
+from src.storage.content_store import ContentStore
+from src.storage.reindex import ReindexState, load_reindex_state, save_reindex_state, embedding_function_key, DEFAULT_COLLECTION
+
+_default_embedding_function = None
+
+def get_default_embedding_function():
+    # Shared across stores so that batched retrieval can embed queries for many characters in one call
+    global _default_embedding_function
+    if _default_embedding_function is None:
+        _default_embedding_function = embedding_functions.DefaultEmbeddingFunction()
+    return _default_embedding_function
 
 class VectorStore:
-    def __init__(self, persist_path: str = "chroma_db"):
+    # Texts whose embeddings are kept in memory (queries, prefetched encounter keys)
+    EMBEDDING_CACHE_SIZE = 1024
+
+    def __init__(self, persist_path: str = "chroma_db", embedding_function=None):
         self.client = chromadb.PersistentClient(path=persist_path)
-        self.collection = self.client.get_or_create_collection(name="memory_stream")
+        # Which collection is live, and any re-index in progress (see src.storage.reindex)
+        self.reindex_state_path = os.path.join(persist_path, "reindex_state.json")
+        self.reindex_state = load_reindex_state(self.reindex_state_path)
+        if embedding_function is None and self.reindex_state.active_collection != DEFAULT_COLLECTION:
+            # Re-indexed to another model: use the embedder persisted with that collection
+            embedding_function = self._persisted_embedding_function(self.reindex_state.active_collection)
+        self.embedding_function = embedding_function or get_default_embedding_function()
+        self.collection = self.client.get_or_create_collection(
+            name=self.reindex_state.active_collection,
+            embedding_function=self.embedding_function
+        )
+        # Collection being filled by a re-index; receives every write as well
+        self.shadow = None
+        self.shadow_embedding_function = None
+        if self.reindex_state.target_collection:
+            self.shadow_embedding_function = self._persisted_embedding_function(self.reindex_state.target_collection)
+            self.shadow = self.client.get_collection(
+                name=self.reindex_state.target_collection,
+                embedding_function=self.shadow_embedding_function
+            )
+        # Held by writers; snapshots take it to see a consistent collection
+        self.lock = threading.RLock()
+        self.entity_index = EntityIndex(os.path.join(persist_path, "entity_index.sqlite3"))
+        # Full content when it differs from the indexed text (i.e. summarized memories)
+        self.content_store = ContentStore(os.path.join(persist_path, "content.sqlite3"))
+        # Bumped on every write, so in-memory copies of the collection can tell they are stale
+        self.revision = 0
+        self._embedding_cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._embedding_cache_lock = threading.Lock()
+        self._backfill_entity_order()
+
+    def _backfill_entity_order(self, batch_size: int = 1000):
+        """Fills in timestamp / importance of entity index rows written before they were stored."""
+        while True:
+            ids = self.entity_index.unordered_ids(limit=batch_size)
+            if not ids:
+                return
+            got = self.collection.get(ids=ids, include=["metadatas"])
+            self.entity_index.set_order(
+                (id, meta.get("timestamp", ""), meta.get("importance", 0)) for id, meta in zip(got['ids'], got['metadatas'])
+            )
+            # Rows whose memory no longer exists
+            self.entity_index.remove(list(set(ids) - set(got['ids'])))
 
     def add_memories(self, memories: List[MemoryItem]):
         ids = [m.id for m in memories]
         # Use summary for embedding if available, otherwise content
         documents = [m.summary if m.summary else m.content for m in memories]
         
+        # Only summarized memories need their full content stored elsewhere
+        summarized = [m for m in memories if m.summary and m.summary != m.content]
+        hashes = dict(zip([m.id for m in summarized], self.content_store.put_many([m.content for m in summarized])))
+
         metadatas = []
         for m in memories:
             meta = {
                 "type": m.type, 
                 "timestamp": str(m.timestamp), 
-                "importance": m.importance,
-                "original_content": m.content # Store original content in metadata
+                "importance": m.importance
             }
+            if m.id in hashes:
+                meta["content_hash"] = hashes[m.id]
+            if m.related_entities:
+                meta["entities"] = "|".join(m.related_entities)
             metadatas.append(meta)
         
-        self.collection.add(
-            ids=ids,
-            documents=documents,
-            metadatas=metadatas
+        with self.lock:
+            self.collection.add(
+                ids=ids,
+                documents=documents,
+                metadatas=metadatas
+            )
+            self._write_shadow(lambda shadow: shadow.add(ids=ids, documents=documents, metadatas=metadatas))
+            self.entity_index.add(
+                (m.id, entity, meta["timestamp"], meta["importance"])
+                for m, meta in zip(memories, metadatas) for entity in m.related_entities
+            )
+            self.revision += 1
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embeds texts through a small LRU cache; misses are embedded in one call."""
+        with self._embedding_cache_lock:
+            cached = {t: self._embedding_cache[t] for t in texts if t in self._embedding_cache}
+            for t in cached:
+                self._embedding_cache.move_to_end(t)
+
+        missing = list(dict.fromkeys(t for t in texts if t not in cached))
+        if missing:
+            vectors = [list(map(float, e)) for e in self.embedding_function(missing)]
+            with self._embedding_cache_lock:
+                for t, vector in zip(missing, vectors):
+                    self._embedding_cache[t] = vector
+                    cached[t] = vector
+                while len(self._embedding_cache) > self.EMBEDDING_CACHE_SIZE:
+                    self._embedding_cache.popitem(last=False)
+        return [cached[t] for t in texts]
+
+    def search(self, query: str, n_results: int = 5, entity: Optional[str] = None) -> List[Dict]:
+        # Optionally scope the vector search to the memories tagged with an entity
+        ids = None
+        if entity:
+            ids = self.entity_index.get_memory_ids(entity)
+            if not ids:
+                return []
+
+        results = self.collection.query(
+            query_embeddings=self.embed([query]),
+            n_results=n_results,
+            ids=ids
         )
+        return self._format_results(results)[0]
+
+    def get_by_entity(self, entity: str, limit: Optional[int] = None) -> List[Dict]:
+        """Fetches an entity's memories directly from the index, most recent first."""
+        # Ordered and limited by SQLite, only the needed records are read from the collection
+        ids = self.entity_index.get_memory_ids(entity, limit=limit)
+        if not ids:
+            return []
+
+        results = self.collection.get(ids=ids)
+        memories = []
+        for i in range(len(results['ids'])):
+            memories.append({
+                "id": results['ids'][i],
+                "document": results['documents'][i],
+                "metadata": results['metadatas'][i],
+                "distance": None
+            })
+        self._hydrate(memories)
+        # Collection order is arbitrary, keep the index's
+        order = {id: i for i, id in enumerate(ids)}
+        memories.sort(key=lambda m: order[m["id"]])
+        return memories
+
+    def get_with_embeddings(self, ids: List[str]) -> List[Dict]:
+        """Fetches memories by id along with their stored embeddings (nothing is re-embedded)."""
+        if not ids:
+            return []
+
+        results = self.collection.get(ids=ids, include=["documents", "metadatas", "embeddings"])
+        memories = []
+        for i in range(len(results['ids'])):
+            memories.append({
+                "id": results['ids'][i],
+                "document": results['documents'][i],
+                "metadata": results['metadatas'][i],
+                "embedding": results['embeddings'][i],
+                "distance": None
+            })
+        self._hydrate(memories)
+        return memories
+
+    def search_many(self, query_embeddings: List[List[float]], n_results: int = 5) -> List[List[Dict]]:
+        """
+        Runs several pre-embedded queries against the collection in a single call.
+        Returns one result list per query, in the same order.
+        """
+        if not query_embeddings:
+            return []
 
-    def search(self, query: str, n_results: int = 5) -> List[Dict]:
         results = self.collection.query(
-            query_texts=[query],
+            query_embeddings=query_embeddings,
             n_results=n_results
         )
-        
-        # Format results
+        return self._format_results(results)
+
+    def _format_results(self, results: Dict) -> List[List[Dict]]:
+        # Format results of every query, then hydrate full content in one bulk lookup
         formatted_results = []
-        if results['ids']:
-            for i in range(len(results['ids'][0])):
-                meta = results['metadatas'][0][i]
-                # Retrieve original content from metadata if available
-                content = meta.get("original_content", results['documents'][0][i])
-                
-                formatted_results.append({
-                    "id": results['ids'][0][i],
-                    "content": content,
-                    "metadata": meta,
-                    "distance": results['distances'][0][i] if results['distances'] else None
+        for q in range(len(results['ids'] or [])):
+            formatted = []
+            for i in range(len(results['ids'][q])):
+                formatted.append({
+                    "id": results['ids'][q][i],
+                    "document": results['documents'][q][i],
+                    "metadata": results['metadatas'][q][i],
+                    "distance": results['distances'][q][i] if results['distances'] else None
                 })
-        return formatted_results
+            formatted_results.append(formatted)
+        self._hydrate([m for formatted in formatted_results for m in formatted])
+        return formatted_results or [[]]
 
-    def update_memory(self, id: str, content: str, type: str, importance: int):
-        self.collection.update(
-            ids=[id],
-            documents=[content],
-            metadatas=[{"type": type, "timestamp": str(datetime.now()), "importance": importance}]
-        )
+    def _hydrate(self, memories: List[Dict]):
+        """Replaces each memory's indexed `document` with its full `content`."""
+        contents = self.content_store.get_many([m["metadata"].get("content_hash") for m in memories])
+        for m in memories:
+            meta = m["metadata"]
+            document = m.pop("document")
+            # Memories written before the content store keep their content in metadata
+            m["content"] = contents.get(meta.get("content_hash")) or meta.get("original_content", document)
+
+    def migrate_legacy_content(self, batch_size: int = 500) -> int:
+        """Moves `original_content` out of the metadata of memories written before the content store."""
+        migrated = 0
+        offset = 0
+        while True:
+            batch = self.collection.get(limit=batch_size, offset=offset)
+            if not batch['ids']:
+                break
+
+            ids, metadatas = [], []
+            for id, document, meta in zip(batch['ids'], batch['documents'], batch['metadatas']):
+                if "original_content" not in meta:
+                    continue
+                original = meta["original_content"]
+                patch = {"original_content": None}  # None removes the key
+                if original != document:
+                    patch["content_hash"] = self.content_store.put_many([original])[0]
+                ids.append(id)
+                metadatas.append(patch)
+
+            if ids:
+                # Metadata-only update, nothing is re-embedded
+                with self.lock:
+                    self.collection.update(ids=ids, metadatas=metadatas)
+                    self._write_shadow(lambda shadow: shadow.update(ids=ids, metadatas=metadatas))
+                    self.revision += 1
+                migrated += len(ids)
+            offset += batch_size
+        return migrated
+
+    def update_memory(self, id: str, content: Optional[str] = None, type: Optional[str] = None, importance: Optional[int] = None):
+        """Partial update: only the given fields change, see `update_many`."""
+        patch = {}
+        if type is not None:
+            patch["type"] = type
+        if importance is not None:
+            patch["importance"] = importance
+        return self.update_many([id], contents=[content], metadatas=[patch])
+
+    def update_many(self, ids: List[str], contents: Optional[List[Optional[str]]] = None,
+                    metadatas: Optional[List[Dict]] = None, batch_size: int = 1000) -> int:
+        """
+        Partial updates for many memories (e.g. importance decay).
+        `metadatas` are patches merged into the stored metadata (None removes a key); a content of
+        None leaves the content alone. Only memories whose indexed text actually changes are
+        re-embedded: metadata patches never are, and a summarized memory keeps its summary as index
+        text, so editing its full content only rewrites the content store.
+        Returns the number of re-embedded memories.
+        """
+        contents = contents or [None] * len(ids)
+        metadatas = metadatas or [{} for _ in ids]
+        reembedded = 0
+
+        for start in range(0, len(ids), batch_size):
+            chunk = list(zip(ids[start:start + batch_size], contents[start:start + batch_size], metadatas[start:start + batch_size]))
+
+            # 1. Current state, only needed where content is edited
+            current = {}
+            edited = [id for id, content, _ in chunk if content is not None]
+            if edited:
+                got = self.collection.get(ids=edited, include=["documents", "metadatas"])
+                stored = self.content_store.get_many([m.get("content_hash") for m in got['metadatas']])
+                for id, document, meta in zip(got['ids'], got['documents'], got['metadatas']):
+                    full = stored.get(meta.get("content_hash")) or meta.get("original_content", document)
+                    current[id] = (document, meta, full)
+
+            # 2. Split into re-embedding and metadata-only updates
+            doc_ids, doc_texts, doc_metas = [], [], []
+            meta_ids, meta_patches = [], []
+            new_contents = {}
+            for id, content, patch in chunk:
+                patch = dict(patch)
+                if content is not None and id in current and content != current[id][2]:
+                    document, _, full = current[id]
+                    summarized = document != full
+                    if summarized and content != document:
+                        # Index text is the summary; the full content lives in the content store
+                        new_contents[id] = content
+                        patch["original_content"] = None
+                    elif summarized:
+                        # Content now equals the indexed text, no separate copy needed
+                        patch.update(content_hash=None, original_content=None)
+                    else:
+                        doc_ids.append(id)
+                        doc_texts.append(content)
+                        # The document is now the full content, drop any stored copy (legacy ones included)
+                        doc_metas.append(dict(patch, content_hash=None, original_content=None))
+                        continue
+                if patch or id in new_contents:
+                    meta_ids.append(id)
+                    meta_patches.append(patch)
+
+            if new_contents:
+                hashes = dict(zip(new_contents, self.content_store.put_many(list(new_contents.values()))))
+                for id, patch in zip(meta_ids, meta_patches):
+                    if id in hashes:
+                        patch["content_hash"] = hashes[id]
+
+            # 3. Write
+            def write(collection):
+                if doc_ids:
+                    collection.update(ids=doc_ids, documents=doc_texts, metadatas=doc_metas)
+                if meta_ids:
+                    collection.update(ids=meta_ids, metadatas=meta_patches)
+
+            with self.lock:
+                write(self.collection)
+                self._write_shadow(write)
+                self._reindex_entities(list(zip(doc_ids + meta_ids, doc_metas + meta_patches)))
+                if doc_ids or meta_ids:
+                    self.revision += 1
+            reembedded += len(doc_ids)
+
+        return reembedded
+
+    def _reindex_entities(self, patches: List[tuple]):
+        # Patches that set "entities" change the index; timestamp / importance change its order
+        changed = [id for id, patch in patches if "entities" in patch]
+        if changed:
+            got = self.collection.get(ids=changed, include=["metadatas"])
+            self.entity_index.remove(changed)
+            self.entity_index.add(
+                (id, entity, meta.get("timestamp"), meta.get("importance"))
+                for id, meta in zip(got['ids'], got['metadatas']) for entity in meta.get("entities", "").split("|") if entity
+            )
+        reordered = [
+            (id, patch.get("timestamp"), patch.get("importance"))
+            for id, patch in patches if "entities" not in patch and ("timestamp" in patch or "importance" in patch)
+        ]
+        if reordered:
+            self.entity_index.set_order(reordered)
 
     def delete_memory(self, id: str):
-        self.collection.delete(ids=[id])
+        with self.lock:
+            self.collection.delete(ids=[id])
+            self._write_shadow(lambda shadow: shadow.delete(ids=[id]))
+            self.entity_index.remove([id])
+            self.revision += 1
+
+    def add_records(self, ids: List[str], documents: List[str], metadatas: List[Dict], embeddings: Optional[List[List[float]]] = None):
+        """
+        Adds records as-is (restore / copy), keeping the entity index in sync. Without
+        `embeddings` (e.g. they came from another model), the documents are embedded.
+        """
+        with self.lock:
+            self.collection.add(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+            # The embeddings belong to the old model, the shadow embeds the documents itself
+            self._write_shadow(lambda shadow: shadow.add(ids=ids, documents=documents, metadatas=metadatas))
+            self.entity_index.add(
+                (id, entity, meta.get("timestamp"), meta.get("importance"))
+                for id, meta in zip(ids, metadatas) for entity in meta.get("entities", "").split("|") if entity
+            )
+            self.revision += 1
+
+    def reset(self):
+        """Drops every memory of this store, cancelling any re-index in progress."""
+        with self.lock:
+            self.drop_shadow()
+            self.client.delete_collection(self.collection.name)
+            self.collection = self.client.get_or_create_collection(
+                name=self.collection.name,
+                embedding_function=self.embedding_function
+            )
+            self.entity_index.clear()
+            self.revision += 1
+
+    # --- Re-indexing ---
+    def _write_shadow(self, write):
+        """
+        Mirrors a write to the re-index shadow, if any. Best effort: the write already reached the
+        live collection, so a shadow error fails the re-index instead of the caller's write.
+        """
+        if self.shadow is None:
+            return
+        try:
+            write(self.shadow)
+        except Exception as e:
+            self.fail_reindex(f"Shadow write failed: {e}")
+
+    def _persisted_embedding_function(self, name: str):
+        # Chroma rebuilds built-in and registered embedding functions from the collection's configuration
+        embedding_function = self.client.get_collection(name).configuration.get("embedding_function")
+        if embedding_function is None:
+            raise ValueError(f"Cannot rebuild the embedding function of collection '{name}'; "
+                             "register it with chromadb's register_embedding_function or pass it explicitly.")
+        return embedding_function
+
+    def begin_shadow(self, embedding_function):
+        """Creates (or resumes) the shadow collection of a re-index and starts dual writes."""
+        name = embedding_function_key(embedding_function)
+        with self.lock:
+            state = self.reindex_state
+            if not (state.target_collection and state.target_embedding_function == name):
+                # Only a shadow built by this very model can be resumed
+                self.drop_shadow()
+                state.target_collection = f"{DEFAULT_COLLECTION}_{datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:6]}"
+                state.target_embedding_function = name
+                state.offset = 0
+                state.copied = 0
+                state.started_at = datetime.now()
+            self.shadow_embedding_function = embedding_function
+            self.shadow = self.client.get_or_create_collection(
+                name=state.target_collection,
+                embedding_function=embedding_function
+            )
+            state.status = "running"
+            state.error = ""
+            save_reindex_state(self.reindex_state_path, state)
+
+    def advance_reindex(self, offset: int, copied: int):
+        with self.lock:
+            self.reindex_state.offset += offset
+            self.reindex_state.copied += copied
+            save_reindex_state(self.reindex_state_path, self.reindex_state)
+
+    def set_reindex_status(self, status: str, error: str = ""):
+        with self.lock:
+            self.reindex_state.status = status
+            self.reindex_state.error = error
+            save_reindex_state(self.reindex_state_path, self.reindex_state)
+
+    def fail_reindex(self, error: str):
+        """
+        Abandons the re-index after an error. The shadow is dropped: live writes stop reaching it
+        from here on, so it could not be resumed consistently.
+        """
+        with self.lock:
+            self.drop_shadow()
+            self.set_reindex_status("failed", error=error)
+
+    def cutover(self, keep_old: bool = True):
+        """
+        Switches reads to the shadow collection. Callers verify it first.
+        Other processes sharing the directory keep writing to the old collection until they
+        restart, so by default it is kept; drop it with `drop_previous_collection` afterwards.
+        """
+        with self.lock:
+            old = self.collection
+            self.collection = self.shadow
+            self.embedding_function = self.shadow_embedding_function
+            self.shadow = None
+            self.shadow_embedding_function = None
+            with self._embedding_cache_lock:
+                self._embedding_cache.clear()
+
+            state = self.reindex_state
+            state.active_collection = state.target_collection
+            state.target_collection = None
+            state.previous_collection = old.name if keep_old else None
+            state.status = "complete"
+            # The state file is the switch other processes pick up on their next start
+            save_reindex_state(self.reindex_state_path, state)
+            self.revision += 1
+            if not keep_old:
+                self.client.delete_collection(old.name)
+
+    def drop_previous_collection(self) -> Optional[str]:
+        """Deletes the collection kept by the last cutover, once every process has switched."""
+        with self.lock:
+            name = self.reindex_state.previous_collection
+            if not name:
+                return None
+            try:
+                self.client.delete_collection(name)
+            except Exception:
+                pass  # Already gone
+            self.reindex_state.previous_collection = None
+            save_reindex_state(self.reindex_state_path, self.reindex_state)
+            return name
+
+    def drop_shadow(self):
+        """Abandons a re-index in progress."""
+        with self.lock:
+            state = self.reindex_state
+            if state.target_collection:
+                try:
+                    self.client.delete_collection(state.target_collection)
+                except Exception:
+                    pass  # Never created
+                state.target_collection = None
+                state.target_embedding_function = ""
+                state.status = "idle"
+                save_reindex_state(self.reindex_state_path, state)
+            self.shadow = None
+            self.shadow_embedding_function = None
 
@@ -0,0 +1,78 @@
+import sys
+import os
+import hashlib
+import shutil
+import tempfile
+
+# Ensure we can import from src
+sys.path.append(os.getcwd())
+
+from chromadb.api.types import EmbeddingFunction
+from src.storage.vector_store import VectorStore
+
+class CountingEmbeddingFunction(EmbeddingFunction):
+    """Offline bag-of-words embedder that counts how many texts it embedded."""
+    def __init__(self):
+        self.embedded = 0
+
+    def __call__(self, input):
+        self.embedded += len(input)
+        vectors = []
+        for text in input:
+            v = [0.0] * 32
+            for word in text.lower().split():
+                v[int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % 32] += 1.0
+            vectors.append(v)
+        return vectors
+
+    @staticmethod
+    def name():
+        return "verify-counting"
+
+    def get_config(self):
+        return {}
+
+    @staticmethod
+    def build_from_config(config):
+        return CountingEmbeddingFunction()
+
+def check(condition: bool, message: str) -> bool:
+    print(f"{'SUCCESS' if condition else 'FAILURE'}: {message}")
+    return condition
+
+def test_partial_updates():
+    path = tempfile.mkdtemp()
+    try:
+        ef = CountingEmbeddingFunction()
+        vs = VectorStore(path, embedding_function=ef)
+        # A memory written before the content store existed keeps its content in metadata
+        vs.collection.add(
+            ids=["L1"], documents=["old text here"],
+            metadatas=[{"type": "observation", "timestamp": "2024-01-01", "importance": 2, "original_content": "old text here"}]
+        )
+        ok = True
+
+        print("Editing a legacy memory...")
+        vs.update_memory("L1", content="brand new text")
+        results = vs.search("brand new text", n_results=1)
+        ok &= check(results[0]["content"] == "brand new text", f"search returns the new content ({results[0]['content']!r})")
+        meta = vs.collection.get(ids=["L1"])["metadatas"][0]
+        ok &= check("original_content" not in meta, "legacy original_content was dropped")
+
+        print("Patching metadata only...")
+        before = ef.embedded
+        vs.update_memory("L1", importance=9)
+        vs.update_many(["L1"], metadatas=[{"type": "thought"}])
+        meta = vs.collection.get(ids=["L1"])["metadatas"][0]
+        ok &= check(ef.embedded == before, "metadata patches did not re-embed")
+        ok &= check(meta["importance"] == 9 and meta["type"] == "thought", "metadata patches were applied")
+
+        print("Saving unchanged content...")
+        vs.update_memory("L1", content="brand new text", type="thought", importance=9)
+        ok &= check(ef.embedded == before, "unchanged content did not re-embed")
+        return ok
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+if __name__ == "__main__":
+    sys.exit(0 if test_partial_updates() else 1)
@@ -0,0 +1,96 @@
+import sys
+import os
+import shutil
+import tempfile
+
+# Ensure we can import from src
+sys.path.append(os.getcwd())
+
+from src.models.schema import CharacterProfile, SocialContext, Personality, Wealth, Health, DailyLogEntry, Relationship
+from src.storage.json_store import JSONStore, ProfileCorruptError
+from src.core.memory_manager import _profile_snapshot, _merge_profiles
+
+def make_profile() -> CharacterProfile:
+    return CharacterProfile(
+        name="Mira",
+        context=SocialContext(world_view="Low fantasy", occupation="Smith", current_location="Forge"),
+        personality=Personality(traits={"Openness": 5}, values=["Honesty"]),
+        relationships={"Tom": Relationship(target_name="Tom", affinity=10, history=["Met at the market."])},
+        wealth=Wealth(currency=10.0),
+        health=Health(),
+        daily_log=[DailyLogEntry(activity="Opened the forge.")]
+    )
+
+def check(condition: bool, message: str) -> bool:
+    print(f"{'SUCCESS' if condition else 'FAILURE'}: {message}")
+    return condition
+
+def test_corrupt_profile() -> bool:
+    path = tempfile.mkdtemp()
+    try:
+        store = JSONStore(os.path.join(path, "profile.json"))
+        store.save_profile(make_profile())
+        with open(store.file_path, "w", encoding="utf-8") as f:
+            f.write('{"name": "Mira", "context": {')
+        ok = True
+
+        print("Loading a corrupt profile...")
+        for label, call in (("load_model", store.load_model), ("get_version", store.get_version)):
+            try:
+                call()
+                ok &= check(False, f"{label} raises ProfileCorruptError")
+            except ProfileCorruptError:
+                ok &= check(True, f"{label} raises ProfileCorruptError")
+
+        print("Saving over a corrupt profile...")
+        try:
+            store.save_profile(make_profile(), expected_version=None, check_version=True)
+            ok &= check(False, "save is refused")
+        except ProfileCorruptError:
+            ok &= check(True, "save is refused")
+        with open(store.file_path, "r", encoding="utf-8") as f:
+            ok &= check(f.read() == '{"name": "Mira", "context": {', "damaged file was left untouched")
+        return ok
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+def test_three_way_merge() -> bool:
+    base_profile = make_profile()
+    base = _profile_snapshot(base_profile)
+
+    # Another writer changed the mood, Tom's affinity and appended to both logs
+    theirs = base_profile.model_copy(deep=True)
+    theirs.personality.mood = "Tired"
+    theirs.relationships["Tom"].affinity = 20
+    theirs.relationships["Tom"].history.append("Tom paid his debt.")
+    theirs.daily_log.append(DailyLogEntry(activity="Sold a sword."))
+
+    # We changed the location and Tom's tags, met Anna and appended to both logs
+    ours = base_profile.model_copy(deep=True)
+    ours.context.current_location = "Market"
+    ours.relationships["Tom"].tags = ["Friend"]
+    ours.relationships["Tom"].history.append("Tom asked for a loan.")
+    ours.relationships["Anna"] = Relationship(target_name="Anna", history=["Anna visited."])
+    ours.daily_log.append(DailyLogEntry(activity="Went to the market."))
+
+    merged = CharacterProfile(**_merge_profiles(base, ours, theirs.model_dump(mode="json")))
+    ok = True
+    print("Merging concurrent profile changes...")
+    ok &= check(merged.personality.mood == "Tired", "their field change is kept")
+    ok &= check(merged.context.current_location == "Market", "our field change is kept")
+    tom = merged.relationships["Tom"]
+    ok &= check(tom.affinity == 20 and tom.tags == ["Friend"], "relationship fields are merged per field")
+    ok &= check(tom.history == ["Met at the market.", "Tom paid his debt.", "Tom asked for a loan."], "relationship histories keep both additions")
+    ok &= check("Anna" in merged.relationships, "our new relationship is kept")
+    ok &= check([e.activity for e in merged.daily_log] == ["Opened the forge.", "Sold a sword.", "Went to the market."], "daily logs keep both additions")
+
+    # Conflicting change to the same field: ours wins
+    theirs.context.occupation = "Merchant"
+    ours.context.occupation = "Blacksmith"
+    merged = CharacterProfile(**_merge_profiles(base, ours, theirs.model_dump(mode="json")))
+    ok &= check(merged.context.occupation == "Blacksmith", "our side wins a conflicting field")
+    return ok
+
+if __name__ == "__main__":
+    results = [test_corrupt_profile(), test_three_way_merge()]
+    sys.exit(0 if all(results) else 1)
@@ -0,0 +1,165 @@
+import sys
+import os
+import hashlib
+import shutil
+import tempfile
+
+# Ensure we can import from src
+sys.path.append(os.getcwd())
+
+from chromadb.api.types import EmbeddingFunction
+from chromadb.utils.embedding_functions import register_embedding_function
+from src.models.schema import MemoryItem
+from src.storage.vector_store import VectorStore
+from src.storage.reindex import Reindexer
+
+@register_embedding_function
+class HashEmbeddingFunction(EmbeddingFunction):
+    """
+    Offline bag-of-words embedder. Every instance shares one `name()`, like the models of
+    sentence-transformers; only the configured dimension tells them apart.
+    """
+    def __init__(self, dimensions: int = 16, fail_after: int = -1, on_call=None):
+        self.dimensions = dimensions
+        # Raise once this many batches were embedded (-1: never)
+        self.fail_after = fail_after
+        self.on_call = on_call
+        self.calls = 0
+
+    def __call__(self, input):
+        self.calls += 1
+        if self.on_call:
+            self.on_call(self.calls)
+        if self.fail_after >= 0 and self.calls > self.fail_after:
+            raise RuntimeError("embedder is down")
+        vectors = []
+        for text in input:
+            v = [0.0] * self.dimensions
+            for word in text.lower().split():
+                v[int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % self.dimensions] += 1.0
+            vectors.append(v)
+        return vectors
+
+    @staticmethod
+    def name():
+        return "verify-hash"
+
+    def get_config(self):
+        return {"dimensions": self.dimensions}
+
+    @staticmethod
+    def build_from_config(config):
+        return HashEmbeddingFunction(config.get("dimensions", 16))
+
+def check(condition: bool, message: str) -> bool:
+    print(f"{'SUCCESS' if condition else 'FAILURE'}: {message}")
+    return condition
+
+def make_store(path: str, count: int = 40) -> VectorStore:
+    vs = VectorStore(path, embedding_function=HashEmbeddingFunction(8))
+    vs.add_memories([
+        MemoryItem(id=f"m{i}", content=f"memory number {i} about the forge", type="observation", importance=i % 10, related_entities=["Tom"])
+        for i in range(count)
+    ])
+    return vs
+
+def add_one(vs: VectorStore, id: str) -> bool:
+    try:
+        vs.add_memories([MemoryItem(id=id, content=f"new memory {id}", type="observation", importance=5, related_entities=["Anna"])])
+        return True
+    except Exception as e:
+        print(f"  add_memories raised: {e}")
+        return False
+
+def test_resume_and_cutover() -> bool:
+    path = tempfile.mkdtemp()
+    try:
+        vs = make_store(path)
+        ok = True
+
+        print("Pausing a re-index...")
+        reindexer = None
+        def cancel_after_first(calls):
+            if calls == 1:
+                reindexer.cancel()
+        reindexer = Reindexer(vs, HashEmbeddingFunction(64, on_call=cancel_after_first), batch_size=10, workers=1)
+        state = reindexer.run()
+        ok &= check(state.status == "paused" and state.offset == 10, f"paused after one batch ({state.status}, offset {state.offset})")
+        ok &= check(add_one(vs, "during-pause"), "live writes work while paused")
+
+        print("Resuming after a restart...")
+        vs = VectorStore(path)
+        ok &= check(vs.shadow is not None, "shadow is reattached on restart")
+        target = vs.reindex_state.target_collection
+        state = Reindexer(vs, HashEmbeddingFunction(64), batch_size=10, workers=1).run()
+        ok &= check(state.status == "complete" and state.active_collection == target, "resumed into the same shadow and cut over")
+        ok &= check(vs.collection.count() == 41 and state.previous_collection is not None, "every memory was copied, old collection kept")
+        results = vs.search("memory number 7 about the forge", n_results=1)
+        ok &= check(len(vs.embed(["x"])[0]) == 64 and bool(results) and results[0]["id"] == "m7", "search uses the new model")
+        ok &= check(add_one(vs, "after-cutover") and bool(vs.get_by_entity("Anna")), "writes after the cutover work")
+
+        print("Reopening after the cutover...")
+        vs = VectorStore(path)
+        ok &= check(vs.embedding_function.get_config() == {"dimensions": 64}, "the new model is used on restart")
+        ok &= check(vs.drop_previous_collection() is not None, "old collection dropped")
+        return ok
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+def test_model_switch() -> bool:
+    path = tempfile.mkdtemp()
+    try:
+        vs = make_store(path)
+        ok = True
+
+        print("Switching models while a re-index is paused...")
+        reindexer = None
+        def cancel_after_first(calls):
+            if calls == 1:
+                reindexer.cancel()
+        reindexer = Reindexer(vs, HashEmbeddingFunction(32, on_call=cancel_after_first), batch_size=10, workers=1)
+        paused = reindexer.run().target_collection
+        state = Reindexer(vs, HashEmbeddingFunction(24), batch_size=10, workers=1).run()
+        ok &= check(state.status == "complete", f"re-index to the other model completed ({state.status}: {state.error})")
+        ok &= check(state.active_collection != paused, "the paused shadow of the first model was not resumed")
+        ok &= check(paused not in [c.name for c in vs.client.list_collections()], "the paused shadow was dropped")
+        ok &= check(len(vs.embed(["x"])[0]) == 24, "reads use the second model")
+        return ok
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+def test_failure() -> bool:
+    path = tempfile.mkdtemp()
+    try:
+        vs = make_store(path)
+        ok = True
+
+        print("Failing a re-index...")
+        try:
+            Reindexer(vs, HashEmbeddingFunction(32, fail_after=1), batch_size=10, workers=1).run()
+            ok &= check(False, "run raises")
+        except RuntimeError:
+            ok &= check(True, "run raises")
+        ok &= check(vs.reindex_state.status == "failed" and "embedder is down" in vs.reindex_state.error, "status is failed with the error")
+        ok &= check(vs.shadow is None and vs.reindex_state.target_collection is None, "shadow is detached and dropped")
+        ok &= check(add_one(vs, "after-failure") and bool(vs.get_by_entity("Anna")), "live writes still work and are indexed")
+
+        print("Breaking the shadow under live writes...")
+        reindexer = None
+        def cancel_after_first(calls):
+            if calls == 1:
+                reindexer.cancel()
+        reindexer = Reindexer(vs, HashEmbeddingFunction(32, on_call=cancel_after_first), batch_size=10, workers=1)
+        reindexer.run()
+        vs.shadow_embedding_function.fail_after = 0
+        revision = vs.revision
+        ok &= check(add_one(vs, "shadow-broken"), "a failing shadow write does not fail the live write")
+        ok &= check(vs.revision == revision + 1 and any(m["id"] == "shadow-broken" for m in vs.get_by_entity("Anna")), "the live write was fully applied")
+        ok &= check(vs.shadow is None and vs.reindex_state.status == "failed", "the re-index was failed and its shadow detached")
+        return ok
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+if __name__ == "__main__":
+    results = [test_resume_and_cutover(), test_model_switch(), test_failure()]
+    sys.exit(0 if all(results) else 1)